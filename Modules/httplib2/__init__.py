@@ -32,8 +32,6 @@ import email
 import email.utils
 import email.message
 import email.feedparser
-import io
-import gzip
 import zlib
 import http.client
 import urllib.parse
@@ -44,6 +42,11 @@ import calendar
 import time
 import random
 import errno
+import queue
+import collections
+import select
+import threading
+import weakref
 from hashlib import sha1 as _sha, md5 as _md5
 import hmac
 from gettext import gettext as _
@@ -56,6 +59,12 @@ try:
 except ImportError:
     socks = None
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
 from .iri2uri import iri2uri
 
 def has_timeout(timeout):
@@ -67,7 +76,8 @@ __all__ = ['Http', 'Response', 'ProxyInfo', 'HttpLib2Error',
            'RedirectMissingLocation', 'RedirectLimit',
            'FailedToDecompressContent', 'UnimplementedDigestAuthOptionError',
            'UnimplementedHmacDigestAuthOptionError',
-           'debuglevel', 'RETRIES']
+           'debuglevel', 'RETRIES', 'ConnectionPool', 'StreamingBody',
+           'RequestTiming', 'TimingHistogram']
 
 
 # The httplib debug level, set to a non-zero value to get debug output
@@ -76,6 +86,19 @@ debuglevel = 0
 # A request will be tried 'RETRIES' times if it fails at the socket/connection level.
 RETRIES = 2
 
+# At most 'POOL_MAXSIZE' connections are kept open per scheme and authority,
+# idle ones are closed after 'POOL_IDLE_TIMEOUT' seconds.
+POOL_MAXSIZE = 10
+POOL_IDLE_TIMEOUT = 60
+
+# Response bodies are read from the socket and inflated 'CHUNK_SIZE' bytes at a time.
+CHUNK_SIZE = 64 * 1024
+
+# With write-behind caching at most 'CACHE_QUEUE_SIZE' cache updates wait to be written.
+CACHE_QUEUE_SIZE = 256
+
+_timer = time.perf_counter
+
 # All exceptions raised here derive from HttpLib2Error
 class HttpLib2Error(Exception): pass
 
@@ -97,6 +120,7 @@ class MalformedHeader(HttpLib2Error): pass
 class RelativeURIError(HttpLib2Error): pass
 class ServerNotFoundError(HttpLib2Error): pass
 class CertificateValidationUnsupportedInPython31(HttpLib2Error): pass
+class ProxiesUnavailableError(HttpLib2Error): pass
 
 # Open Items:
 # -----------
@@ -328,24 +352,165 @@ def _entry_disposition(response_headers, request_headers):
             retval = "FRESH"
     return retval
 
+def _read_chunks(response, chunk_size=CHUNK_SIZE, timing=None):
+    """Yields the body of an httplib response as it arrives."""
+    while True:
+        chunk = response.read(chunk_size)
+        if not chunk:
+            return
+        if timing is not None:
+            timing.received += len(chunk)
+        yield chunk
+
+def _inflate(chunks, encoding):
+    """Decompresses an iterable of gzip or deflate chunks one at a time,
+    so the whole compressed body is never held in memory.
+
+    A gzip body may be made of several members. Whatever follows the last
+    one is ignored, like the NUL padding some servers append, and so is
+    anything after the end of a deflate stream."""
+    if encoding == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    else:
+        decompressor = zlib.decompressobj()
+    leftover = b""
+    trailing = False
+    for chunk in chunks:
+        if trailing:
+            continue
+        chunk, leftover = leftover + chunk, b""
+        while chunk:
+            if not decompressor.eof:
+                data = decompressor.decompress(chunk)
+                if data:
+                    yield data
+                chunk = decompressor.unused_data if decompressor.eof else b""
+                continue
+            chunk = chunk.lstrip(b"\x00") if encoding == 'gzip' else chunk
+            if encoding == 'gzip' and len(chunk) < 2:
+                # Too short to tell whether another member starts
+                chunk, leftover = b"", chunk
+            elif encoding == 'gzip' and chunk[:2] == b"\x1f\x8b":
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                chunk, trailing = b"", True
+    data = decompressor.flush()
+    if data:
+        yield data
+    if not decompressor.eof:
+        raise zlib.error("Compressed content ended early")
+
 def _decompressContent(response, new_content):
+    """new_content is either the whole body or an iterable of its
+    chunks, which are then inflated as they are read."""
     content = new_content
+    encoding = response.get('content-encoding', None)
     try:
-        encoding = response.get('content-encoding', None)
         if encoding in ['gzip', 'deflate']:
-            if encoding == 'gzip':
-                content = gzip.GzipFile(fileobj=io.BytesIO(new_content)).read()
-            if encoding == 'deflate':
-                content = zlib.decompress(content)
+            if isinstance(new_content, bytes):
+                new_content = [new_content]
+            content = b"".join(_inflate(new_content, encoding))
             response['content-length'] = str(len(content))
             # Record the historical presence of the encoding in a way the won't interfere.
             response['-content-encoding'] = response['content-encoding']
             del response['content-encoding']
-    except IOError:
+        elif not isinstance(content, bytes):
+            content = b"".join(content)
+    except (IOError, zlib.error):
         content = ""
-        raise FailedToDecompressContent(_("Content purported to be compressed with %s but failed to decompress.") % response.get('content-encoding'), response, content)
+        raise FailedToDecompressContent(_("Content purported to be compressed with %s but failed to decompress.") % encoding, response, content)
     return content
 
+
+class StreamingBody(object):
+    """The body of a response requested with stream=True.
+
+    It is read from the socket and inflated one chunk at a time, either by
+    iterating over it for chunks of bytes or through read() like a file.
+    The connection goes back to the pool once the body has been read to
+    the end, closing it early closes the connection. The time spent
+    reading and inflating is added to timing, the timing hooks of the
+    request run once the body is finished either way.
+    """
+    def __init__(self, response, chunks, timing=None):
+        self.response = response
+        self.timing = timing
+        self._chunks = iter(chunks)
+        self._buffer = b""
+        self._release = None
+        self._timed = None
+        self.closed = False
+
+    def __iter__(self):
+        if self._buffer:
+            data, self._buffer = self._buffer, b""
+            yield data
+        while True:
+            data = self._next()
+            if data is None:
+                return
+            yield data
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = b"".join([self._buffer] + list(iter(self._next, None)))
+            self._buffer = b""
+            return data
+        chunks, length = [self._buffer], len(self._buffer)
+        while length < size:
+            data = self._next()
+            if data is None:
+                break
+            chunks.append(data)
+            length += len(data)
+        data = b"".join(chunks)
+        data, self._buffer = data[:size], data[size:]
+        return data
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self._finish(False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _next(self):
+        if self.closed:
+            return None
+        start = _timer()
+        try:
+            data = next(self._chunks, None)
+        except zlib.error:
+            error = FailedToDecompressContent(_("Content purported to be compressed with %s but failed to decompress.") % self.response.get('-content-encoding'), self.response, b"")
+            self._finish(False, start, error)
+            raise error
+        except BaseException as e:
+            self._finish(False, start, e)
+            raise
+        if data is None:
+            self._finish(True, start)
+        elif self.timing is not None:
+            self.timing.download += _timer() - start
+        return data
+
+    def _finish(self, reusable, start=None, error=None):
+        if not self.closed:
+            self.closed = True
+            if self.timing is not None:
+                if start is not None:
+                    self.timing.download += _timer() - start
+                if error is not None:
+                    self.timing.error = error
+            if self._release is not None:
+                self._release(reusable)
+            if self._timed is not None:
+                self._timed()
+
 def _bind_write_headers(msg):
   from email.header import Header
   def _write_headers(self):
@@ -404,6 +569,59 @@ def _updateCache(request_headers, response_headers, content, cache, cachekey):
 
             cache.set(cachekey, text)
 
+class _CacheWriter(object):
+    """Runs cache updates on a background thread, in the order they were
+    queued. When the queue is full the update waits for it to be written
+    out and then runs in the caller. Pending updates are written out by
+    close(), when the writer is collected or before the interpreter exits,
+    whichever comes first."""
+    def __init__(self, maxsize=CACHE_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize)
+        # The thread and the finalizer only hold the queue, so a writer
+        # nobody closed is still collected and its thread stopped
+        self._thread = threading.Thread(target=_run_cache_writer, args=(self._queue,), name='httplib2-cache-writer')
+        self._thread.daemon = True
+        self._thread.start()
+        self._finalizer = weakref.finalize(self, _stop_cache_writer, self._queue, self._thread)
+
+    def submit(self, function, *args):
+        if not self._finalizer.alive:
+            function(*args)
+            return
+        try:
+            self._queue.put_nowait((function, args))
+        except queue.Full:
+            self.flush()
+            function(*args)
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        """Writes out the pending updates and stops the thread."""
+        self._finalizer()
+
+
+def _run_cache_writer(updates):
+    while True:
+        update = updates.get()
+        try:
+            if update is None:
+                return
+            function, args = update
+            function(*args)
+        except Exception:
+            # A failed cache write only costs a later cache miss
+            pass
+        finally:
+            updates.task_done()
+
+def _stop_cache_writer(updates, thread):
+    updates.put(None)
+    if thread is not threading.current_thread():
+        thread.join()
+
+
 def _cnonce():
     dig = _md5(("%s:%s" % (time.ctime(), ["0123456789"[random.randrange(0, 9)] for i in range(20)])).encode('utf-8')).hexdigest()
     return dig[:16]
@@ -698,6 +916,220 @@ class FileCache(object):
         if os.path.exists(cacheFullPath):
             os.remove(cacheFullPath)
 
+
+class _FileLock(object):
+    """An exclusive lock on a file, held between processes as well as
+    between threads since every acquisition opens the file again."""
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.filename, "a+b")
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK only retries for about ten seconds
+                    pass
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+class SharedFileCache(object):
+    """A FileCache that several threads and processes can share.
+
+    Entries are named by the sha1 of their key and spread over 256 shard
+    directories. They are written to a temporary file and renamed into
+    place, so a reader never sees a partial entry. Reading an entry marks
+    it as recently used. Once the entries written since the last check
+    could take the cache over 'max_bytes', the least recently used ones
+    are evicted under a lock file, down to 'low_water' of the budget.
+    """
+    def __init__(self, cache, max_bytes=256 * 1024 ** 2, low_water=0.9):
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self._lock = threading.Lock()
+        # Bytes known to be stored, None until the first scan
+        self._size = None
+        for shard in range(256):
+            os.makedirs(os.path.join(cache, '%02x' % shard), exist_ok=True)
+
+    def _path(self, key):
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        name = _sha(key).hexdigest()
+        return os.path.join(self.cache, name[:2], name)
+
+    def get(self, key):
+        cacheFullPath = self._path(key)
+        try:
+            with open(cacheFullPath, "rb") as f:
+                retval = f.read()
+        except IOError:
+            return None
+        try:
+            os.utime(cacheFullPath, None)
+        except OSError:
+            pass
+        return retval
+
+    def set(self, key, value):
+        cacheFullPath = self._path(key)
+        temporary = '%s.%s.%s.tmp' % (cacheFullPath, os.getpid(), threading.get_ident())
+        with open(temporary, "wb") as f:
+            f.write(value)
+        try:
+            os.replace(temporary, cacheFullPath)
+        except OSError:
+            # The entry is open in another process on Windows, it stays as it was
+            os.remove(temporary)
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size += len(value)
+            over = self._size is None or self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits
+        in low_water of its budget, returns the bytes stored afterwards."""
+        with _FileLock(os.path.join(self.cache, 'lock')):
+            entries, size = [], 0
+            for shard in range(256):
+                try:
+                    scan = os.scandir(os.path.join(self.cache, '%02x' % shard))
+                except OSError:
+                    continue
+                with scan:
+                    for entry in scan:
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        if entry.name.endswith('.tmp'):
+                            # Left behind by a process that died while writing
+                            if time.time() - stat.st_mtime > 3600:
+                                self._remove(entry.path)
+                            continue
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        size += stat.st_size
+            if size > self.max_bytes:
+                entries.sort()
+                for mtime, length, filename in entries:
+                    if size <= self.max_bytes * self.low_water:
+                        break
+                    if self._remove(filename):
+                        size -= length
+        with self._lock:
+            self._size = size
+        return size
+
+    def _remove(self, filename):
+        try:
+            os.remove(filename)
+            return True
+        except OSError:
+            return False
+
+
+class MemoryCache(object):
+    """An in-process cache of at most 'max_bytes', the least recently used
+    entries are dropped first. Lookups cost no I/O.
+
+    If 'backing' is another cache (a FileCache or SharedFileCache), every
+    set and delete is written through to it and misses are looked up
+    there, so entries survive the process. The hits, misses and evictions
+    counters are kept for the memory part only.
+    """
+    def __init__(self, max_bytes=32 * 1024 ** 2, backing=None):
+        self.max_bytes = max_bytes
+        self.backing = backing
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        if self.backing is not None:
+            value = self.backing.get(key)
+            if value is not None:
+                self._store(key, value)
+        return value
+
+    def set(self, key, value):
+        self._store(key, value)
+        if self.backing is not None:
+            self.backing.set(key, value)
+
+    def delete(self, key):
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self.size -= len(value)
+        if self.backing is not None:
+            self.backing.delete(key)
+
+    def clear(self):
+        """Empties the memory part, the backing cache is kept."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.size,
+                    'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions}
+
+    def _store(self, key, value):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            if len(value) > self.max_bytes:
+                # Never kept in memory, it would evict everything else
+                return
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+
 class Credentials(object):
     def __init__(self):
         self.credentials = []
@@ -721,7 +1153,7 @@ class KeyCerts(Credentials):
 
 class ProxyInfo(object):
   """Collect information required to use a proxy."""
-  def __init__(self, proxy_type, proxy_host, proxy_port, proxy_rdns=True, proxy_user=None, proxy_pass=None):
+  def __init__(self, proxy_type, proxy_host, proxy_port, proxy_rdns=True, proxy_user=None, proxy_pass=None, bypass_hosts=()):
       """
         Args:
           proxy_type: The type of proxy server.  This must be set to one of
@@ -742,8 +1174,13 @@ class ProxyInfo(object):
           proxy_user: The username used to authenticate with the proxy server.
 
           proxy_pass: The password used to authenticate with the proxy server.
+
+          bypass_hosts: Host names, or domain suffixes starting with a dot,
+          reached directly instead of through the proxy. '*' bypasses it
+          for every host.
       """
       self.proxy_type, self.proxy_host, self.proxy_port, self.proxy_rdns, self.proxy_user, self.proxy_pass = proxy_type, proxy_host, proxy_port, proxy_rdns, proxy_user, proxy_pass
+      self.bypass_hosts = bypass_hosts
 
   def astuple(self):
     return (self.proxy_type, self.proxy_host, self.proxy_port, self.proxy_rdns,
@@ -752,6 +1189,21 @@ class ProxyInfo(object):
   def isgood(self):
     return socks and (self.proxy_host != None) and (self.proxy_port != None)
 
+  def applies_to(self, hostname):
+    """Whether requests to hostname go through the proxy."""
+    hostname = hostname.lower()
+    for bypass in self.bypass_hosts:
+      if bypass == '*' or hostname == bypass.lstrip('.') or hostname.endswith('.' + bypass.lstrip('.')):
+        return False
+    return True
+
+  def headers(self):
+    """The Proxy-Authorization header for the proxy credentials, if any."""
+    if self.proxy_user is None and self.proxy_pass is None:
+      return {}
+    credentials = '%s:%s' % (self.proxy_user or '', self.proxy_pass or '')
+    return {'Proxy-Authorization': 'Basic ' + base64.b64encode(credentials.encode('utf-8')).decode('ascii')}
+
 
 def proxy_info_from_environment(method='http'):
     """
@@ -764,7 +1216,10 @@ def proxy_info_from_environment(method='http'):
     url = os.environ.get(env_var, os.environ.get(env_var.upper()))
     if not url:
         return
-    return proxy_info_from_url(url, method)
+    proxy_info = proxy_info_from_url(url, method)
+    no_proxy = os.environ.get('no_proxy', os.environ.get('NO_PROXY', ''))
+    proxy_info.bypass_hosts = tuple(host.strip() for host in no_proxy.split(',') if host.strip())
+    return proxy_info
 
 
 def proxy_info_from_url(url, method='http'):
@@ -781,6 +1236,8 @@ def proxy_info_from_url(url, method='http'):
             username, password = ident.split(':', 1)
         else:
             password = ident
+        username = username and urllib.parse.unquote(username)
+        password = password and urllib.parse.unquote(password)
     else:
         host_port = url[1]
     if ':' in host_port:
@@ -818,6 +1275,62 @@ class HTTPConnectionWithTimeout(http.client.HTTPConnection):
         http.client.HTTPConnection.__init__(self, host, port=port,
                                             timeout=timeout)
         self.proxy_info = proxy_info
+        self.timing = None
+        self._create_connection = _timed_create_connection(self)
+        # Through a proxy the request line carries the absolute URI
+        self._proxy_target = None
+        if _proxy_in_use(proxy_info):
+            self._proxy_target = '%s:%s' % (self.host, self.port)
+            self.host, self.port = proxy_info.proxy_host, proxy_info.proxy_port
+
+    def putrequest(self, method, url, *args, **kwargs):
+        if self._proxy_target is not None and url.startswith('/'):
+            url = 'http://%s%s' % (self._proxy_target, url)
+        http.client.HTTPConnection.putrequest(self, method, url, *args, **kwargs)
+        if self._proxy_target is not None:
+            for header, value in self.proxy_info.headers().items():
+                self.putheader(header, value)
+
+
+def _proxy_in_use(proxy_info):
+    """Whether a connection goes through proxy_info, only HTTP proxies are
+    supported."""
+    if proxy_info is None or proxy_info.proxy_host is None or proxy_info.proxy_port is None:
+        return False
+    if proxy_info.proxy_type != 3: # socks.PROXY_TYPE_HTTP
+        raise ProxiesUnavailableError("Only HTTP proxies are supported, not proxy type %s" % proxy_info.proxy_type)
+    return True
+
+
+# SSL contexts are shared by every connection with the same certificates, so
+# the CA bundle is parsed once per process and TLS sessions can be resumed.
+_ssl_contexts = {}
+_tls_sessions = {}
+_ssl_lock = threading.Lock()
+
+
+def _ssl_context(ca_certs, cert_file, key_file, disable_ssl_certificate_validation):
+    """Returns the process wide SSLContext for these certificates, TLS 1.2
+    or later only."""
+    key = (ca_certs, cert_file, key_file, bool(disable_ssl_certificate_validation))
+    with _ssl_lock:
+        context = _ssl_contexts.get(key)
+        if context is None:
+            if not hasattr(ssl, 'SSLContext'):
+                raise CertificateValidationUnsupportedInPython31()
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            context.minimum_version = ssl.TLSVersion.TLSv1_2
+            if disable_ssl_certificate_validation:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            else:
+                context.verify_mode = ssl.CERT_REQUIRED
+                context.check_hostname = True
+                context.load_verify_locations(ca_certs)
+            if cert_file:
+                context.load_cert_chain(cert_file, key_file)
+            _ssl_contexts[key] = context
+        return context
 
 
 class HTTPSConnectionWithTimeout(http.client.HTTPSConnection):
@@ -828,28 +1341,335 @@ class HTTPSConnectionWithTimeout(http.client.HTTPSConnection):
     Python's default timeout for sockets will be used. See for example
     the docs of socket.setdefaulttimeout():
     http://docs.python.org/library/socket.html#socket.setdefaulttimeout
+
+    The SSL context is shared with every connection using the same
+    certificates and the last TLS session of each host is offered again
+    on reconnect, skipping the full handshake when the server accepts it.
+
+    Through a proxy the connection is a CONNECT tunnel, authenticated with
+    the proxy credentials. A tunnel kept alive in the pool is reused by
+    later requests to the same host.
     """
 
     def __init__(self, host, port=None, key_file=None, cert_file=None,
                  timeout=None, proxy_info=None,
                  ca_certs=None, disable_ssl_certificate_validation=False):
         self.proxy_info = proxy_info
-        context = None
         if ca_certs is None:
             ca_certs = CA_CERTS
-        if (cert_file or ca_certs) and not disable_ssl_certificate_validation:
-            if not hasattr(ssl, 'SSLContext'):
-                raise CertificateValidationUnsupportedInPython31()
-            context = ssl.SSLContext(ssl.PROTOCOL_TLSv1)
-            context.verify_mode = ssl.CERT_REQUIRED
-            if cert_file:
-                context.load_cert_chain(cert_file, key_file)
-            if ca_certs:
-                context.load_verify_locations(ca_certs)
+        context = _ssl_context(ca_certs, cert_file, key_file,
+                               disable_ssl_certificate_validation)
         http.client.HTTPSConnection.__init__(
-                self, host, port=port, key_file=key_file,
-                cert_file=cert_file, timeout=timeout, context=context,
-                check_hostname=True)
+                self, host, port=port, timeout=timeout, context=context)
+        self.timing = None
+        self._create_connection = _timed_create_connection(self)
+        if _proxy_in_use(proxy_info):
+            self.set_tunnel(self.host, self.port, proxy_info.headers())
+            self.host, self.port = proxy_info.proxy_host, proxy_info.proxy_port
+
+    def _tunnel(self):
+        # The CONNECT round trip is part of connecting
+        start = _timer()
+        http.client.HTTPSConnection._tunnel(self)
+        if self.timing is not None:
+            self.timing.connect += _timer() - start
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        server_hostname = self._tunnel_host or self.host
+        session_key = (self._context, server_hostname, self.port)
+        session = _tls_sessions.get(session_key)
+        start = _timer()
+        try:
+            if session is not None:
+                self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname, session=session)
+            else:
+                self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname)
+        except BaseException:
+            self.sock.close()
+            self.sock = None
+            raise
+        if self.timing is not None:
+            self.timing.tls += _timer() - start
+        self._remember_session()
+
+    def close(self):
+        # TLS 1.3 servers send the session ticket after the handshake
+        self._remember_session()
+        http.client.HTTPSConnection.close(self)
+
+    def _remember_session(self):
+        session = getattr(self.sock, 'session', None)
+        if session is not None:
+            _tls_sessions[(self._context, self._tunnel_host or self.host, self.port)] = session
+
+
+class RequestTiming(object):
+    """Where the time of one Http.request went, in seconds.
+
+    dns, connect and tls are only spent when a new connection is opened,
+    send covers writing the request, wait the server time until the
+    response headers arrive and download reading and inflating the body,
+    as it is consumed for streamed bodies. The phases add up over every exchange the
+    request needed (authentication retries, redirects are timed apart).
+    connections counts the new connections, reused the exchanges sent
+    over a kept-alive one, retries the exchanges sent again after a
+    connection failure. sent and received are request and response body
+    bytes as they went over the wire, before inflating.
+    """
+    PHASES = ('dns', 'connect', 'tls', 'send', 'wait', 'download', 'total')
+
+    def __init__(self, method, uri):
+        self.method = method
+        self.uri = uri
+        self.status = None
+        self.fromcache = False
+        self.error = None
+        self.dns = self.connect = self.tls = 0.0
+        self.send = self.wait = 0.0
+        self.download = 0.0
+        self.total = 0.0
+        self.connections = 0
+        self.reused = 0
+        self.retries = 0
+        self.sent = 0
+        self.received = 0
+
+    def __repr__(self):
+        return '<RequestTiming %s %s %s %s>' % (self.method, self.uri, self.status,
+            ' '.join('%s=%.1fms' % (phase, getattr(self, phase) * 1000) for phase in self.PHASES if getattr(self, phase)))
+
+
+class TimingHistogram(object):
+    """Aggregates RequestTimings into a histogram per phase.
+
+    An instance is a hook, so it can be appended to Http.timing_hooks of
+    one or more Http objects directly. dump() returns a plain text table,
+    reset() starts over.
+    """
+    # Upper bounds of the buckets in milliseconds
+    BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float('inf'))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.fromcache = 0
+            self.errors = 0
+            self.connections = 0
+            self.reused = 0
+            self.retries = 0
+            self.sent = 0
+            self.received = 0
+            self.buckets = dict((phase, [0] * len(self.BOUNDS)) for phase in RequestTiming.PHASES)
+            self.sums = dict((phase, 0.0) for phase in RequestTiming.PHASES)
+            self.counts = dict((phase, 0) for phase in RequestTiming.PHASES)
+
+    def __call__(self, timing):
+        with self._lock:
+            self.requests += 1
+            self.fromcache += timing.fromcache
+            self.errors += timing.error is not None
+            self.connections += timing.connections
+            self.reused += timing.reused
+            self.retries += timing.retries
+            self.sent += timing.sent
+            self.received += timing.received
+            for phase in RequestTiming.PHASES:
+                value = getattr(timing, phase)
+                if not value:
+                    continue
+                milliseconds = value * 1000
+                for index, bound in enumerate(self.BOUNDS):
+                    if milliseconds <= bound:
+                        self.buckets[phase][index] += 1
+                        break
+                self.sums[phase] += value
+                self.counts[phase] += 1
+
+    def percentile(self, phase, fraction):
+        """The upper bound in milliseconds of the bucket holding the given
+        fraction of the timed requests, None when nothing was timed."""
+        with self._lock:
+            wanted = fraction * self.counts[phase]
+            seen = 0
+            for index, count in enumerate(self.buckets[phase]):
+                seen += count
+                if count and seen >= wanted:
+                    return self.BOUNDS[index]
+        return None
+
+    def summary(self):
+        """Totals and, per phase, the count, mean and p50/p90/p99 in milliseconds."""
+        phases = {}
+        for phase in RequestTiming.PHASES:
+            if self.counts[phase]:
+                phases[phase] = {'count': self.counts[phase],
+                                 'mean': self.sums[phase] * 1000 / self.counts[phase],
+                                 'p50': self.percentile(phase, 0.5),
+                                 'p90': self.percentile(phase, 0.9),
+                                 'p99': self.percentile(phase, 0.99)}
+        with self._lock:
+            return {'requests': self.requests, 'fromcache': self.fromcache,
+                    'errors': self.errors, 'connections': self.connections,
+                    'reused': self.reused, 'retries': self.retries,
+                    'sent': self.sent, 'received': self.received,
+                    'phases': phases}
+
+    def dump(self):
+        summary = self.summary()
+        lines = ['%(requests)d requests, %(fromcache)d from cache, %(errors)d failed, '
+                 '%(connections)d new connections, %(reused)d reused, %(retries)d retries, '
+                 '%(sent)d bytes sent, %(received)d received' % summary]
+        lines.append('%-9s %7s %9s %8s %8s %8s' % ('phase', 'count', 'mean ms', 'p50', 'p90', 'p99'))
+        for phase in RequestTiming.PHASES:
+            if phase in summary['phases']:
+                stats = summary['phases'][phase]
+                lines.append('%-9s %7d %9.1f %8s %8s %8s' % (phase, stats['count'], stats['mean'],
+                             '<=%g' % stats['p50'], '<=%g' % stats['p90'], '<=%g' % stats['p99']))
+        return '\n'.join(lines)
+
+
+def _timed_create_connection(conn):
+    """A socket.create_connection for conn that records the DNS lookup
+    and the TCP connect apart in conn.timing."""
+    def create_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+        timing = conn.timing
+        host, port = address
+        start = _timer()
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        if timing is not None:
+            timing.dns += _timer() - start
+        error = None
+        for family, socktype, proto, canonname, sockaddr in addresses:
+            sock = None
+            start = _timer()
+            try:
+                sock = socket.socket(family, socktype, proto)
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+            except socket.error as e:
+                error = e
+                if sock is not None:
+                    sock.close()
+                continue
+            if timing is not None:
+                timing.connect += _timer() - start
+                timing.connections += 1
+            return sock
+        if error is not None:
+            raise error
+        raise socket.error("getaddrinfo returns an empty list")
+    return create_connection
+
+
+def _connection_is_usable(conn):
+    """A kept-alive connection is only reused while the server has not
+    closed it. After a complete response nothing should be readable, so a
+    readable socket means the peer hung up or sent something unexpected."""
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not readable
+
+
+class ConnectionPool(object):
+    """Keep-alive connections per 'scheme:authority' key, shared safely
+    between threads.
+
+    A connection is checked out with get(), used for a single request and
+    response, and handed back with put(), or with discard() when it failed.
+    At most 'maxsize' connections per key exist at any time, get() waits
+    for one to be handed back beyond that. Idle connections are closed
+    after 'idle_timeout' seconds and health checked before being reused.
+    """
+    def __init__(self, maxsize=POOL_MAXSIZE, idle_timeout=POOL_IDLE_TIMEOUT):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._condition = threading.Condition()
+        # Map key to a list of (connection, time it was handed back)
+        self._idle = {}
+        # Map key to the number of connections open, idle or checked out
+        self._open = collections.Counter()
+
+    def get(self, key, factory):
+        """Returns an idle connection for key, the most recently used
+        first, or a new one made by calling factory()."""
+        stale = []
+        with self._condition:
+            while True:
+                idle = self._idle.get(key)
+                conn = None
+                while idle:
+                    candidate, since = idle.pop()
+                    if time.time() - since <= self.idle_timeout and _connection_is_usable(candidate):
+                        conn = candidate
+                        break
+                    stale.append(candidate)
+                    self._open[key] -= 1
+                if conn is not None or self._open[key] < self.maxsize:
+                    break
+                self._condition.wait()
+            if conn is None:
+                self._open[key] += 1
+            if stale:
+                self._condition.notify(len(stale))
+        for candidate in stale:
+            candidate.close()
+        if conn is None:
+            try:
+                conn = factory()
+            except BaseException:
+                self._release(key)
+                raise
+        return conn
+
+    def put(self, key, conn):
+        """Hands a connection back for reuse."""
+        with self._condition:
+            self._idle.setdefault(key, []).append((conn, time.time()))
+            self._condition.notify()
+
+    def discard(self, key, conn):
+        """Closes a connection that can not be reused."""
+        conn.close()
+        self._release(key)
+
+    def clear(self):
+        """Closes every idle connection."""
+        with self._condition:
+            idle, self._idle = self._idle, {}
+            for key, conns in idle.items():
+                self._open[key] -= len(conns)
+            self._condition.notify_all()
+        for conns in idle.values():
+            for conn, since in conns:
+                conn.close()
+
+    def __contains__(self, key):
+        with self._condition:
+            return self._open[key] > 0
+
+    def __len__(self):
+        with self._condition:
+            return sum(self._open.values())
+
+    def _release(self, key):
+        with self._condition:
+            self._open[key] -= 1
+            self._condition.notify()
+
+
+_ConnectionLease = collections.namedtuple('_ConnectionLease', 'key factory')
 
 
 SCHEME_TO_CONNECTION = {
@@ -873,7 +1693,9 @@ class Http(object):
     """
     def __init__(self, cache=None, timeout=None,
                  proxy_info=proxy_info_from_environment,
-                 ca_certs=None, disable_ssl_certificate_validation=False):
+                 ca_certs=None, disable_ssl_certificate_validation=False,
+                 pool_maxsize=POOL_MAXSIZE, pool_idle_timeout=POOL_IDLE_TIMEOUT,
+                 cache_write_behind=False):
         """If 'cache' is a string then it is used as a directory name for
         a disk cache. Otherwise it must be an object that supports the
         same interface as FileCache.
@@ -896,19 +1718,41 @@ class Http(object):
 
         If disable_ssl_certificate_validation is true, SSL cert validation will
         not be performed.
+
+        At most pool_maxsize keep-alive connections are opened per scheme and
+        authority, so one instance can be shared by many threads. Connections
+        idle for more than pool_idle_timeout seconds are closed.
+
+        If cache_write_behind is true, responses are written to the cache
+        by a background thread instead of before request() returns, call
+        flush_cache() to wait for them and close() to stop the thread once
+        done. Pending writes are also flushed when the interpreter exits,
+        processes that leave without exit handlers, such as multiprocessing
+        workers, must call close() to keep them.
 """
         self.proxy_info = proxy_info
+        # Map scheme to the proxy resolved for it
+        self._proxies = {}
         self.ca_certs = ca_certs
         self.disable_ssl_certificate_validation = \
                 disable_ssl_certificate_validation
-        # Map domain name to an httplib connection
-        self.connections = {}
+        # Map domain name to a pool of httplib connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_idle_timeout = pool_idle_timeout
+        self.connections = ConnectionPool(pool_maxsize, pool_idle_timeout)
         # The location of the cache, for now a directory
         # where cached responses are held.
         if cache and isinstance(cache, str):
             self.cache = FileCache(cache)
         else:
             self.cache = cache
+        self.cache_write_behind = cache_write_behind
+        self._cache_writer = None
+        self._cache_writer_lock = threading.Lock()
+
+        # Callables given the RequestTiming of every request once it is done
+        self.timing_hooks = []
+        self._timing = threading.local()
 
         # Name/password
         self.credentials = Credentials()
@@ -947,11 +1791,64 @@ class Http(object):
             del state_dict['request']
         if 'connections' in state_dict:
             del state_dict['connections']
+        state_dict.pop('_cache_writer', None)
+        state_dict.pop('_cache_writer_lock', None)
+        state_dict.pop('_timing', None)
         return state_dict
 
     def __setstate__(self, state):
         self.__dict__.update(state)
-        self.connections = {}
+        self.connections = ConnectionPool(self.pool_maxsize, self.pool_idle_timeout)
+        self._cache_writer = None
+        self._cache_writer_lock = threading.Lock()
+        self._timing = threading.local()
+
+    def _proxy_info_for(self, scheme, hostname):
+        """The proxy to reach hostname through, resolved once per scheme."""
+        if scheme not in self._proxies:
+            proxy_info = self.proxy_info
+            if callable(proxy_info):
+                proxy_info = proxy_info(scheme)
+            self._proxies[scheme] = proxy_info
+        proxy_info = self._proxies[scheme]
+        if proxy_info is not None and not proxy_info.applies_to(hostname):
+            return None
+        return proxy_info
+
+    def _update_cache(self, request_headers, response_headers, content, cachekey):
+        if not self.cache_write_behind:
+            _updateCache(request_headers, response_headers, content, self.cache, cachekey)
+        elif cachekey:
+            # The caller keeps the response, the writer gets copies
+            self._writer().submit(_updateCache, dict(request_headers), copy.copy(response_headers), content, self.cache, cachekey)
+
+    def _delete_cache(self, cachekey):
+        if not self.cache_write_behind:
+            self.cache.delete(cachekey)
+        else:
+            # Queued as well so it can not be overtaken by an earlier write
+            self._writer().submit(self.cache.delete, cachekey)
+
+    def _writer(self):
+        with self._cache_writer_lock:
+            if self._cache_writer is None:
+                self._cache_writer = _CacheWriter()
+            return self._cache_writer
+
+    def flush_cache(self):
+        """Waits for the pending write-behind cache updates."""
+        if self._cache_writer is not None:
+            self._cache_writer.flush()
+
+    def close(self):
+        """Writes out the pending write-behind cache updates, stops their
+        thread and closes the idle pooled connections. The instance can
+        still be used afterwards, it starts over."""
+        with self._cache_writer_lock:
+            writer, self._cache_writer = self._cache_writer, None
+        if writer is not None:
+            writer.close()
+        self.connections.clear()
 
     def _auth_from_challenge(self, host, request_uri, headers, response, content):
         """A generator that creates Authorization objects
@@ -979,15 +1876,48 @@ class Http(object):
         self.credentials.clear()
         self.authorizations = []
 
-    def _conn_request(self, conn, request_uri, method, body, headers):
+    def _conn_request(self, lease, request_uri, method, body, headers, stream=False):
+        """Checks a connection out of the pool for a single request and
+        response, the connection is handed back once the body has been read."""
+        conn = self.connections.get(lease.key, lease.factory)
+        conn.timing = getattr(self._timing, 'current', None)
+        try:
+            (response, content) = self._conn_exchange(conn, request_uri, method, body, headers, stream)
+        except BaseException:
+            conn.timing = None
+            self.connections.discard(lease.key, conn)
+            raise
+        conn.timing = None
+        if isinstance(content, StreamingBody):
+            def release(reusable):
+                if reusable:
+                    self.connections.put(lease.key, conn)
+                else:
+                    self.connections.discard(lease.key, conn)
+            content._release = release
+        else:
+            self.connections.put(lease.key, conn)
+        return (response, content)
+
+    def _conn_exchange(self, conn, request_uri, method, body, headers, stream=False):
+        timing = conn.timing or RequestTiming(method, request_uri)
+        attempts = 0
         i = 0
         seen_bad_status_line = False
         while i < RETRIES:
             i += 1
+            attempts += 1
+            if attempts > 1:
+                timing.retries += 1
             try:
                 if conn.sock is None:
                     conn.connect()
+                else:
+                    timing.reused += 1
+                start = _timer()
                 conn.request(method, request_uri, body, headers)
+                timing.send += _timer() - start
+                timing.sent += len(body) if body else 0
             except socket.timeout:
                 conn.close()
                 raise
@@ -1016,7 +1946,9 @@ class Http(object):
                 # that the server didn't send a response.
                 pass
             try:
+                start = _timer()
                 response = conn.getresponse()
+                timing.wait += _timer() - start
             except (http.client.BadStatusLine, http.client.ResponseNotReady):
                 # If we get a BadStatusLine on the first try then that means
                 # the connection just went stale, so retry regardless of the
@@ -1044,17 +1976,30 @@ class Http(object):
                 content = b""
                 if method == "HEAD":
                     conn.close()
+                    response = Response(response)
+                elif stream and 200 <= response.status < 300:
+                    chunks = _read_chunks(response, timing=timing)
+                    response = Response(response)
+                    encoding = response.get('content-encoding', None)
+                    if encoding in ['gzip', 'deflate']:
+                        chunks = _inflate(chunks, encoding)
+                        response['-content-encoding'] = response['content-encoding']
+                        del response['content-encoding']
+                        if 'content-length' in response:
+                            del response['content-length']
+                    content = StreamingBody(response, chunks, timing)
                 else:
-                    content = response.read()
-                response = Response(response)
-                if method != "HEAD":
-                    content = _decompressContent(response, content)
+                    start = _timer()
+                    chunks = _read_chunks(response, timing=timing)
+                    response = Response(response)
+                    content = _decompressContent(response, chunks)
+                    timing.download += _timer() - start
 
             break
         return (response, content)
 
 
-    def _request(self, conn, host, absolute_uri, request_uri, method, body, headers, redirections, cachekey):
+    def _request(self, conn, host, absolute_uri, request_uri, method, body, headers, redirections, cachekey, stream=False):
         """Do the actual request using the connection object
         and also follow one level of redirects if necessary"""
 
@@ -1063,18 +2008,20 @@ class Http(object):
         if auth:
             auth.request(method, request_uri, headers, body)
 
-        (response, content) = self._conn_request(conn, request_uri, method, body, headers)
+        (response, content) = self._conn_request(conn, request_uri, method, body, headers, stream)
 
         if auth:
             if auth.response(response, body):
+                if isinstance(content, StreamingBody):
+                    content.close()
                 auth.request(method, request_uri, headers, body)
-                (response, content) = self._conn_request(conn, request_uri, method, body, headers )
+                (response, content) = self._conn_request(conn, request_uri, method, body, headers, stream)
                 response._stale_digest = 1
 
         if response.status == 401:
             for authorization in self._auth_from_challenge(host, request_uri, headers, response, content):
                 authorization.request(method, request_uri, headers, body)
-                (response, content) = self._conn_request(conn, request_uri, method, body, headers, )
+                (response, content) = self._conn_request(conn, request_uri, method, body, headers, stream)
                 if response.status != 401:
                     self.authorizations.append(authorization)
                     authorization.response(response, body)
@@ -1097,7 +2044,7 @@ class Http(object):
                         response['-x-permanent-redirect-url'] = response['location']
                         if 'content-location' not in response:
                             response['content-location'] = absolute_uri
-                        _updateCache(headers, response, content, self.cache, cachekey)
+                        self._update_cache(headers, response, content, cachekey)
                     if 'if-none-match' in headers:
                         del headers['if-none-match']
                     if 'if-modified-since' in headers:
@@ -1115,15 +2062,16 @@ class Http(object):
                           body = None
                         (response, content) = self.request(
                             location, method=redirect_method, body=body,
-                            headers=headers, redirections=redirections - 1)
+                            headers=headers, redirections=redirections - 1,
+                            stream=stream)
                         response.previous = old_response
                 else:
                     raise RedirectLimit("Redirected more times than redirection_limit allows.", response, content)
-            elif response.status in [200, 203] and method in ["GET", "HEAD"]:
+            elif response.status in [200, 203] and method in ["GET", "HEAD"] and not stream:
                 # Don't cache 206's since we aren't going to handle byte range requests
                 if 'content-location' not in response:
                     response['content-location'] = absolute_uri
-                _updateCache(headers, response, content, self.cache, cachekey)
+                self._update_cache(headers, response, content, cachekey)
 
         return (response, content)
 
@@ -1135,7 +2083,7 @@ class Http(object):
 # including all socket.* and httplib.* exceptions.
 
 
-    def request(self, uri, method="GET", body=None, headers=None, redirections=DEFAULT_MAX_REDIRECTS, connection_type=None):
+    def request(self, uri, method="GET", body=None, headers=None, redirections=DEFAULT_MAX_REDIRECTS, connection_type=None, stream=False):
         """ Performs a single HTTP request.
 The 'uri' is the URI of the HTTP resource and can begin
 with either 'http' or 'https'. The value of 'uri' must be an absolute URI.
@@ -1155,7 +2103,41 @@ exception is 'redirections. The default is 5.
 The return value is a tuple of (response, content), the first
 being and instance of the 'Response' class, the second being
 a string that contains the response entity body.
+
+If 'stream' is true a successful response is not read up front, the
+content is then a StreamingBody that reads and inflates the entity body
+as it is consumed. Streamed responses bypass the cache, their timing
+hooks run once the body has been read to the end or closed.
         """
+        timing = RequestTiming(method, uri)
+        outer = getattr(self._timing, 'current', None)
+        self._timing.current = timing
+        start = _timer()
+        content = None
+        try:
+            (response, content) = self._send_request(uri, method, body, headers, redirections, connection_type, stream)
+        except BaseException as e:
+            timing.error = e
+            raise
+        else:
+            timing.status = response.status
+            timing.fromcache = response.fromcache
+        finally:
+            self._timing.current = outer
+            if isinstance(content, StreamingBody) and not content.closed:
+                # Received and download are only known once it is read
+                content._timed = lambda: self._run_timing_hooks(timing, start)
+            else:
+                self._run_timing_hooks(timing, start)
+        return (response, content)
+
+    def _run_timing_hooks(self, timing, start):
+        timing.total = _timer() - start
+        for hook in self.timing_hooks:
+            hook(timing)
+
+    def _send_request(self, uri, method, body, headers, redirections, connection_type, stream):
+        """The request itself, timed by request()."""
         try:
             if headers is None:
                 headers = {}
@@ -1174,40 +2156,43 @@ a string that contains the response entity body.
                 authority = domain_port[0]
 
             conn_key = scheme+":"+authority
-            if conn_key in self.connections:
-                conn = self.connections[conn_key]
-            else:
-                if not connection_type:
-                    connection_type = SCHEME_TO_CONNECTION[scheme]
+            if not connection_type:
+                connection_type = SCHEME_TO_CONNECTION[scheme]
+
+            def new_connection():
                 certs = list(self.certificates.iter(authority))
+                proxy_info = self._proxy_info_for(scheme, authority.rsplit(':', 1)[0].strip('[]'))
                 if issubclass(connection_type, HTTPSConnectionWithTimeout):
                     if certs:
-                        conn = self.connections[conn_key] = connection_type(
+                        conn = connection_type(
                                 authority, key_file=certs[0][0],
                                 cert_file=certs[0][1], timeout=self.timeout,
-                                proxy_info=self.proxy_info,
+                                proxy_info=proxy_info,
                                 ca_certs=self.ca_certs,
                                 disable_ssl_certificate_validation=
                                         self.disable_ssl_certificate_validation)
                     else:
-                        conn = self.connections[conn_key] = connection_type(
+                        conn = connection_type(
                                 authority, timeout=self.timeout,
-                                proxy_info=self.proxy_info,
+                                proxy_info=proxy_info,
                                 ca_certs=self.ca_certs,
                                 disable_ssl_certificate_validation=
                                         self.disable_ssl_certificate_validation)
                 else:
-                    conn = self.connections[conn_key] = connection_type(
+                    conn = connection_type(
                             authority, timeout=self.timeout,
-                            proxy_info=self.proxy_info)
+                            proxy_info=proxy_info)
                 conn.set_debuglevel(debuglevel)
+                return conn
+
+            conn = _ConnectionLease(conn_key, new_connection)
 
             if 'range' not in headers and 'accept-encoding' not in headers:
                 headers['accept-encoding'] = 'gzip, deflate'
 
             info = email.message.Message()
             cached_value = None
-            if self.cache:
+            if self.cache and not stream:
                 cachekey = defrag_uri
                 cached_value = self.cache.get(cachekey)
                 if cached_value:
@@ -1219,7 +2204,7 @@ a string that contains the response entity body.
                             info.replace_header(k,
                                                 str(*email.header.decode_header(v)[0]))
                     except (IndexError, ValueError):
-                        self.cache.delete(cachekey)
+                        self._delete_cache(cachekey)
                         cachekey = None
                         cached_value = None
             else:
@@ -1231,7 +2216,7 @@ a string that contains the response entity body.
 
             if method not in ["GET", "HEAD"] and self.cache and cachekey:
                 # RFC 2616 Section 13.10
-                self.cache.delete(cachekey)
+                self._delete_cache(cachekey)
 
             # Check the vary header in the cache to see if this request
             # matches what varies in the cache.
@@ -1296,7 +2281,7 @@ a string that contains the response entity body.
                     merged_response = Response(info)
                     if hasattr(response, "_stale_digest"):
                         merged_response._stale_digest = response._stale_digest
-                    _updateCache(headers, merged_response, content, self.cache, cachekey)
+                    self._update_cache(headers, merged_response, content, cachekey)
                     response = merged_response
                     response.status = 200
                     response.fromcache = True
@@ -1304,7 +2289,7 @@ a string that contains the response entity body.
                 elif response.status == 200:
                     content = new_content
                 else:
-                    self.cache.delete(cachekey)
+                    self._delete_cache(cachekey)
                     content = new_content
             else:
                 cc = _parse_cache_control(headers)
@@ -1313,7 +2298,7 @@ a string that contains the response entity body.
                     response = Response(info)
                     content = b""
                 else:
-                    (response, content) = self._request(conn, authority, uri, request_uri, method, body, headers, redirections, cachekey)
+                    (response, content) = self._request(conn, authority, uri, request_uri, method, body, headers, redirections, cachekey, stream)
         except Exception as e:
             if self.force_exception_to_status_code:
                 if isinstance(e, HttpLib2ErrorWithResponse):
@@ -2,26 +2,52 @@
 
 from __future__ import print_function
 
+import asyncio
+import json
+import logging
+import re
 import sys
 
+from array import array
+from codecs import getincrementaldecoder
 from calendar import monthrange, weekday
 from collections import OrderedDict
-from datetime import date, datetime
-from os import chdir, makedirs, path
+from functools import wraps
+from itertools import chain, islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from heapq import heapify, heappush, heappushpop
+from multiprocessing import Manager, cpu_count, freeze_support
+from os import chdir, getpid, makedirs, mkdir, path, remove, replace, rmdir
 from PIL import Image
+from random import uniform
 from queue import Empty, Queue
 from sys import argv, executable, exit
-from time import sleep
-from threading import Lock, Thread
+from time import monotonic, sleep, time
+from threading import BoundedSemaphore, Lock, RLock, Thread, get_ident
+
+try: # Typed columns are kept in the array module without it
+	import numpy
+
+except ImportError:
+	numpy = None
+
+try: # The quota day falls back to a fixed offset without it
+	from zoneinfo import ZoneInfo
+
+except ImportError:
+	ZoneInfo = None
 
 from win32com.shell import shell # Windows Modules
 
 from PyQt5 import QtCore, QtGui, QtWidgets # GUI Modules
 from analyticalGUI import Ui_Interface
 
-from googleapiclient import sample_tools # Analytics Modules
+import httplib2 # Analytics Modules
+
+from googleapiclient import discovery, sample_tools
 from googleapiclient.errors import HttpError
-from oauth2client.client import AccessTokenRefreshError
+from oauth2client.client import AccessTokenRefreshError, OAuth2Credentials
 
 from openpyxl import styles, workbook # Excel Modules
 from openpyxl.chart import BarChart, LineChart, PieChart, series, Reference
@@ -51,10 +77,50 @@ imagespath = path.join(realpath, 'Images')
 otherspath = path.join(realpath, 'Others')
 infopath = path.join(realpath, 'companyinfo')
 secretpath = path.join(realpath, 'client_secrets.json')
+cachepath = path.join(realpath, 'Cache')
+monthlypath = path.join(realpath, 'Monthly')
+httpcachepath = path.join(realpath, 'HttpCache')
+quotapath = path.join(realpath, 'quota.json')
+discoverypath = path.join(otherspath, 'analytics.json')
+logpath = path.join(realpath, 'analytical.log')
 
 months = {'01':'Janeiro', '02':'Fevereiro', '03':'Março', '04':'Abril', '05':'Maio', '06':'Junho', '07':'Julho', '08':'Agosto', '09':'Setembro', '10':'Outubro', '11':'Novembro', '12':'Dezembro'}
 weekdays = {0:'Segunda-Feira', 1:'Terça-Feira', 2:'Quarta-Feira', 3:'Quinta-Feira', 4:'Sexta-Feira', 5:'Sábado', 6:'Domingo'}
 
+workers = 0 # Parallel report processes, 0 starts as many as the cores, profiles and per user rate allow, 1 writes every report in this process
+serial = False # Fetches and writes the profiles one after another in the fetching thread, without worker processes nor the fetch engine
+batchlimit = 10 # Queries sent in a single batch call, Google Analytics accepts up to 10
+ratelimit = 10 # Google Analytics requests per second per user
+dailyquota = 50000 # Google Analytics requests per project per day
+profileconcurrency = 10 # Concurrent requests Google Analytics allows per profile
+quotazone = 'America/Los_Angeles' # Time zone where the daily quota is reset
+quotaoffset = -8 # Hours from UTC where the daily quota is reset, used when the time zone is unknown
+retries = 5 # Retries of a rate limited or failed request
+backoff = 1 # Seconds before the first retry, doubled on every retry and jittered
+retryreasons = ('userRateLimitExceeded', 'rateLimitExceeded', 'quotaExceeded') # Retried 403 reasons, 'dailyLimitExceeded' is not
+refreshmargin = 300 # Seconds before expiring that the access token is refreshed in the background
+discoveryurl = 'https://www.googleapis.com/discovery/v1/apis/analytics/v3/rest' # Analytics v3 discovery document
+discoveryrefresh = False # Downloads a newer discovery document in the background, used from the next run on
+listlimit = 1000 # Items per page on the management listings
+inflight = httplib2.POOL_MAXSIZE # Queries kept in flight by the asyncio fetch engine when writing in a single process, 0 fetches one profile at a time, more only wait on the pooled connections
+
+cachesize = 512 * 1024 ** 2 # Bytes kept in the results cache
+httpcachesize = 64 * 1024 ** 2 # Bytes of management listings kept for conditional requests
+cachettl = 900 # Seconds a cached result that may still change is reused
+processingdays = 2 # Days Google Analytics may take to finish processing the data of a day
+
+fidelity = 'full' # Query plan, 'full' fetches every row the xlsx sheets list and 'report' only the rows the PDF report reads
+sheetrows = {'tracking': 6} # Rows read by the xlsx sheets, the other sheets list every row
+reportrows = {'access': 10, 'search': 10, 'country': 11, 'city': 11, 'page': 10, 'tracking': 6} # Rows read by the PDF report, countries and cities skip a '(not set)' row
+toplimit = 10 # Rows of the ranked tables on the PDF report, the last one gathers the rest when the shares are listed
+pagesize = 10000 # Rows per page on the paginated queries, the most Google Analytics returns
+paginated = ('search', 'page', 'tracking') # Queries fetched a page at a time when not capped by the plan
+streaming = False # Pages after the first of a paginated query are decoded row by row from the response body, and then not kept in the results cache
+streamrows = 1000 # Rows of a streamed page handed to the sheets at a time
+integertypes = ('INTEGER',) # Google Analytics dataTypes held as integer columns
+floattypes = ('FLOAT', 'PERCENT', 'TIME', 'CURRENCY') # Google Analytics dataTypes held as float columns
+folded = {'ga:dateHour': 'ga:hour'} # Dimensions whose values are only read in part, replaced by a coarser one aggregated by Google Analytics
+
 titles = ['Sessões (Gerais)', 'Fontes de Acesso', 'Palavras-Chaves', 'Sessões (Países)', 'Sessões (Cidades)', 'Páginas', 'Sessões (Diárias)', 'Tracking de Páginas', 'Sessões (Anuais)']
 
 group = OrderedDict() # Google Analytics queries
@@ -66,7 +132,7 @@ group['city'] = ['ga:city', 'ga:sessions, ga:pageviews, ga:bounceRate', '-ga:ses
 group['page'] = ['ga:pageTitle', 'ga:pageviews, ga:avgTimeOnPage', '-ga:pageviews']
 group['daily'] = ['ga:dateHour', 'ga:users']
 group['tracking'] = ['ga:landingPagePath, ga:secondPagePath', 'ga:entrances', '-ga:entrances']
-group['yearly'] = ['ga:month', 'ga:sessions']
+group['yearly'] = ['ga:yearMonth', 'ga:sessions'] # Only the months missing from the monthly store are queried
 
 images = OrderedDict() # Images paths
 images['logo'] = {'path':path.join(imagespath, 'logo.jpg'), 'width':180}
@@ -259,7 +325,8 @@ class Interface(QtWidgets.QMainWindow, Ui_Interface): # Main Interface
 
 					profilesinfo.append([profile_id, website, startdate, enddate])
 
-				self.FetchProcess = Thread(target = FilesWriter, args = (self.pipe, profilesinfo))
+				self.FetchProcess = Thread(target = FilesWriter, args = (self.pipe, profilesinfo, (companysite, cellphone)))
+				self.laststring = None
 				self.lengthbar = 100 / len(profilesinfo)
 				self.processgoing = True
 
@@ -271,6 +338,7 @@ class Interface(QtWidgets.QMainWindow, Ui_Interface): # Main Interface
 		else:
 			try:
 				string = self.pipe.get(False)
+				self.laststring = string
 
 				if 'Fetching' not in string and self.prevdone:
 					self.WriteProgress.setValue(round(self.WriteProgress.value() + self.lengthbar))
@@ -298,7 +366,7 @@ class Interface(QtWidgets.QMainWindow, Ui_Interface): # Main Interface
 				if not self.FetchProcess.is_alive():
 					self.WriteTimer.stop()
 					self.AnimationLabel.hide()
-					self.InformationLabel.setText('Could not retrieve information from Google Analytics servers')
+					self.InformationLabel.setText(self.laststring or 'Could not retrieve information from Google Analytics servers') # The writer sends its error last
 					self.InformationLabel.setStyleSheet('color: red')
 
 			self.Animation()
@@ -365,7 +433,7 @@ class Interface(QtWidgets.QMainWindow, Ui_Interface): # Main Interface
 
 class Statistics(object):
 
-	def WorksheetGenerator(wbook, results, title, startdate, enddate, yeardate):
+	def WorksheetGenerator(wbook, results, title, startdate, enddate, reportdata):
 
 		company = results.get('profileInfo').get('profileName')
 		filename = company + ' ' + startdate + ' ' + enddate + '.xlsx'
@@ -375,6 +443,7 @@ class Statistics(object):
 		header.insert(0, u'')
 
 		x = 0
+		lines = len(results.get('rows', [])) # Counted as they are written on the paginated sheets
 
 		for y in range(1, len(header)):
 			header[y] = header[y].capitalize()
@@ -382,7 +451,6 @@ class Statistics(object):
 		if results.get('rows', []):
 			if title == 'Sessões (Gerais)':
 				percentage = True
-				c, sessionsum, usersum, pagevsum, upagevsum, monthlysessiond, monthlytimep, rejectionrate = 0, 0, 0, 0, 0, 0, 0, 0
 
 				wsheet = wbook.active
 				wsheet.title = title
@@ -390,37 +458,25 @@ class Statistics(object):
 				header.append('Pagepersession')
 				wsheet.append([u''])
 				wsheet.append(header)
-				sessionlist = []
-
-				for data in results.get('rows', []):
-					data[0] = data[0][:4] + '-' + data[0][4:6] + '-' + data[0][6:8] # Rearrange date
-					sessionsum += int(data[1]) # Overall session sum
-					usersum += int(data[2]) # Overall user sum
-					pagevsum += int(data[3]) # Overall pageviews sum
-					upagevsum += int(data[4]) # Overall unique pageviews sum
-					monthlysessiond += float(data[5]) # Monthly session duration
-					monthlytimep += float(data[6]) # Monthly time on page
-					rejectionrate += float(data[7]) # Number of single page sessions (30 minutes without interacting)
-
-					data[5] = TimeFormat(data[5])
-					data[6] = TimeFormat(data[6])
-					data[7] = float(data[7]) / 100
-
-					sessionlist.append(int(data[1]))
-
-					IntegerFormat(data, percentage)
-					data.insert(0, u'')
-					wsheet.append(data)
-
-					c += 1
 
-				monthlysessiond = TimeFormat(monthlysessiond / c)
-				monthlytimep = TimeFormat(monthlytimep / c)
+				table = ResultTable(results.get('columnHeaders'), results.get('rows', []))
+				sessionsum = int(table.Sum(1)) # Overall session sum
+				usersum = int(table.Sum(2)) # Overall user sum
+				pagevsum = int(table.Sum(3)) # Overall pageviews sum
+				upagevsum = int(table.Sum(4)) # Overall unique pageviews sum
+				monthlysessiond = TimeFormat(table.Mean(5)) # Average daily session duration
+				monthlytimep = TimeFormat(table.Mean(6)) # Average daily time on page
+				rejectionrate = table.Mean(7) / 100 # Average daily share of single page sessions (30 minutes without interacting)
+				sessionlist = table.Values(1)
+
+				for day, (_, sessions, users, pageviews, upageviews, duration, timeonpage, bouncerate) in zip(DateColumn(table[0]), table.Rows()):
+					data = [u'', day, sessions, users, pageviews, upageviews, TimeFormat(duration), TimeFormat(timeonpage), bouncerate / 100]
+					wsheet.append(data)
 
 				try:
 					total = [u'', 'Total', sessionsum, usersum, pagevsum, upagevsum]
-					avg = [u'', 'Média', round(sessionsum / c), round(usersum / c), round(pagevsum / c), round(upagevsum / c), monthlysessiond, 
-						monthlytimep, rejectionrate / c / 100, round(pagevsum / sessionsum, 1)]
+					avg = [u'', 'Média', round(table.Mean(1)), round(table.Mean(2)), round(table.Mean(3)), round(table.Mean(4)), monthlysessiond, 
+						monthlytimep, rejectionrate, round(pagevsum / sessionsum, 1)]
 
 				except ZeroDivisionError:
 					total = [u'', 'Total', '0', '0', '0', '0']
@@ -429,7 +485,9 @@ class Statistics(object):
 				wsheet.append([u''])
 				wsheet.append(total)
 				wsheet.append(avg)
-				PDFlist.extend([sessionlist, sessionsum, usersum, avg[2], pagevsum, avg[9], monthlysessiond, str(round(float(avg[8]) * 100)) +'%'])
+				reportdata.sessionsperday, reportdata.sessionsum, reportdata.usersum, reportdata.avgsessions = sessionlist, sessionsum, usersum, avg[2]
+				reportdata.pagevsum, reportdata.avgpageviews, reportdata.sessionduration = pagevsum, avg[9], monthlysessiond
+				reportdata.rejectionrate = str(round(float(avg[8]) * 100)) + '%'
 				
 				Statistics.ChartConstruction(wsheet, ['col', 16], 'Sessões de ' + months[enddate.split('-')[1]], 'M10', 3, 2, 3, 33, False)
 				wsheet.cell('B34').font = headerfont
@@ -446,24 +504,23 @@ class Statistics(object):
 				wsheet.append([u''])
 				wsheet.append(header)
 
-				clist, csessions, cpagepersession, crejectionrate = [], [], [], []
-
-				for data in results.get('rows', []):
-					data[2] = str(round(int(data[2]) / int(data[1]), 2))
-					data[3] = float(data[3]) / 100
+				ranking = Ranking(toplimit, skip = ('(not set)',))
 
-					if not len(clist) >= 10 and data[0] != '(not set)':
-						clist.append(data[0])
-						csessions.append(int(data[1]))
-						cpagepersession.append(float(data[2]))
-						crejectionrate.append(str(round(float(data[3]) * 100)) + '%')
+				for name, sessions, pageviews, bouncerate in ResultTable(results.get('columnHeaders'), results.get('rows', [])).Rows():
+					data = [u'', name, sessions, round(pageviews / sessions, 2), bouncerate / 100]
 
-					IntegerFormat(data, percentage)
-					data.insert(0, u'')
+					ranking.Add(name, sessions, data[3], str(round(bouncerate)) + '%')
 					wsheet.append(data)
 
+				clist, csessions, _, cpagepersession, crejectionrate = ranking.Columns()
+
 				Statistics.ChartConstruction(wsheet, ['pie', None], '10 ' + title.split(' ')[1].strip(')(') + ' com Mais Sessões', 'H4', 3, 2, 3, 12, [2, 3, 12])
-				PDFlist.extend([clist, csessions, cpagepersession, crejectionrate])
+
+				if title == 'Sessões (Países)':
+					reportdata.country = (clist, csessions, cpagepersession, crejectionrate)
+
+				else:
+					reportdata.city = (clist, csessions, cpagepersession, crejectionrate)
 
 
 			elif title == 'Sessões (Diárias)':
@@ -477,12 +534,8 @@ class Statistics(object):
 				wsheet.append([u''])
 				wsheet.append(header)
 					
-				for data in results.get('rows', []):
-					if int(data[0][-2:]) in hourlydict:
-						hourlydict[int(data[0][-2:])] += int(data[1])
-
-					else:
-						hourlydict[int(data[0][-2:])] = int(data[1])
+				for hour, sessions in ResultTable(results.get('columnHeaders'), results.get('rows', [])).Rows():
+					hourlydict[int(hour[-2:])] = hourlydict.get(int(hour[-2:]), 0) + sessions
 
 				hourlist, hsessions = [], []
 
@@ -490,11 +543,10 @@ class Statistics(object):
 					data = [u'', hour, users]
 					hourlist.append(str(hour))
 					hsessions.append(users)
-					IntegerFormat(data, percentage)
 					wsheet.append(data)
 
 				Statistics.ChartConstruction(wsheet, ['lin', 13], 'Sessões Diárias', 'F7', 3, 2, 3, 25, False)
-				PDFlist.extend([hourlist, hsessions])
+				reportdata.hours, reportdata.hoursessions = hourlist, hsessions
 
 
 			elif title == 'Fontes de Acesso' or title == 'Palavras-Chaves':
@@ -506,26 +558,24 @@ class Statistics(object):
 				wsheet.append([u''])
 				wsheet.append(header)
 
-				for sessionsum in results.get('rows', []):
-					x += int(sessionsum[1])
+				x = Total(results, 1) # Also counts the rows the query planner left out
 
-				flist, fsessions, fpercentage = [], [], []
+				ranking = Ranking(toplimit - 1, x, other = 'Outros')
+				lines = 0
 
-				for data in results.get('rows', []):
-					data.append(float(data[1]) / x)
+				for page in Pages(results): # Written as the pages arrive, converted a page at a time
+					for source, sessions in ResultTable(results.get('columnHeaders'), page).Rows():
+						data = [u'', source, sessions, sessions / x]
 
-					if not len(flist) >= 10:
-						flist.append(data[0])
-						fsessions.append(int(data[1]))
+						ranking.Add(source, sessions)
+						wsheet.append(data)
+						lines += 1
 
-					IntegerFormat(data, percentage)
-					data.insert(0, u'')
-					wsheet.append(data)
-
-				for each in fsessions:
-					fpercentage.extend([str(round(each / sum(fsessions) * 100)) + '%'])
+				if title == 'Fontes de Acesso':
+					reportdata.access = ranking
 
-				PDFlist.extend([flist, fsessions, fpercentage])
+				else:
+					reportdata.search = ranking
 
 
 			elif title == 'Páginas':
@@ -537,37 +587,30 @@ class Statistics(object):
 				wsheet.append([u''])
 				wsheet.append(header)
 
-				for sessionsum in results.get('rows', []):
-					x += int(sessionsum[1])
-
-				plist, ppageview, ppercentage, pavgtimeonpage = [], [], [], []
+				x = Total(results, 1)
 
-				for data in results.get('rows', []):
-					data[2] = TimeFormat(data[2])
+				ranking = Ranking(toplimit - 1, x, other = 'Outros')
+				lines = 0
 
-					plist.append(data[0])
-					ppageview.append(int(data[1]))
-					pavgtimeonpage.append(data[2])
+				for page in Pages(results): # Written as the pages arrive, converted a page at a time
+					for pagetitle, pageviews, timeonpage in ResultTable(results.get('columnHeaders'), page).Rows():
+						data = [u'', pagetitle, pageviews, TimeFormat(timeonpage), pageviews / x]
 
-					IntegerFormat(data, percentage)
-					data.insert(0, u'')
-					data.insert(4, float(data[2]) / x)
-					wsheet.append(data)
-
-				for each in ppageview:
-					ppercentage.append(str(round(each / sum(ppageview) * 100)) + '%')
+						ranking.Add(pagetitle, pageviews, data[3])
+						wsheet.append(data)
+						lines += 1
 
-				PDFlist.extend([plist, ppageview, ppercentage, pavgtimeonpage])
+				reportdata.pages = ranking
 
 			elif title == 'Tracking de Páginas':
 
 				pagetrack = []
 
-				for data in results.get('rows', [])[:6]:
-					if data[0] != data[1] and data[1] != '(not set)':
-						pagetrack.append(data[:2])
+				for landing, second, entrances in islice(chain.from_iterable(ResultTable(results.get('columnHeaders'), page).Rows() for page in Pages(results)), 6):
+					if landing != second and second != '(not set)':
+						pagetrack.append([landing, second])
 
-				PDFlist.append(pagetrack)
+				reportdata.pagetrack = pagetrack
 
 				return
 
@@ -580,24 +623,16 @@ class Statistics(object):
 				wsheet.append([u''])
 				wsheet.append(header)
 
-				for sessionsum in results.get('rows', []):
-					x += int(sessionsum[1])
-
-				month = yeardate.split('-')[1]
-				ordlist = results.get('rows', [])[int(month) - 1:] + results.get('rows', [])[:int(month) - 1] # Improves Google monthly display
-				
-				ysessions, monthlist = [], []
+				table = ResultTable(results.get('columnHeaders'), results.get('rows', []))
+				x = int(table.Sum(1))
 
-				for data in ordlist:
-					IntegerFormat(data, percentage)
-					ysessions.append(data[1])
+				ysessions, monthlist = table.Values(1), []
 
-					if month == '13':
-						month = '01'
+				for yearmonth, sessions in table.Rows(): # Rolling window built by the monthly store, oldest month first
+					month = yearmonth[-2:]
 
-					wsheet.append([u'', months[month], data[1]])
+					wsheet.append([u'', months[month], sessions])
 					monthlist.append(months[month][:3] + '.')
-					month = str(int(month) + 1).zfill(2)
 
 				data = [u'', 'Média', round(int(x) / 12)]
 				wsheet.append([u''])
@@ -605,22 +640,22 @@ class Statistics(object):
 				wsheet.cell('B16').font = headerfont
 
 				Statistics.ChartConstruction(wsheet, ['lin', 13], 'Sessões Anuais', 'F3', 3, 2, 3, 14, [2, 3, 14])
-				PDFlist.extend([ysessions, round(int(x) / 12), monthlist])
+				reportdata.ysessions, reportdata.avgvisitspermonth, reportdata.monthlist = ysessions, round(int(x) / 12), monthlist
 					
 
 			if percentage == True:
-				for i in range(3, len(results.get('rows', [])) + 6):
+				for i in range(3, lines + 6):
 					wsheet[chr(len(data) + 64) + str(i)].number_format = '0%'
 
 			Statistics.HeaderFormat(wsheet, len(header))
-			Statistics.WorksheetFormat(wsheet, len(data), len(results.get('rows', [])))
+			Statistics.WorksheetFormat(wsheet, len(data), lines)
 
 			if title == 'Sessões (Anuais)':
 				wbook.save(filename = filepath)
 
 				del wbook
 
-				Report.PageGenerator(filename.rpartition('.')[0], enddate)
+				Report.PageGenerator(filename.rpartition('.')[0], enddate, reportdata)
 
 
 	def HeaderFormat(wsheet, header):
@@ -680,32 +715,38 @@ class Statistics(object):
 
 class Report(object):
 
-	def PageGenerator(filename, enddate):
+	def PageGenerator(filename, enddate, reportdata):
 
-		global doc, story
+		missing = reportdata.Missing()
 
-		info, sessionsperday, sessionsum, usersum, avgsessions, pagevsum, avgpageviews, monthlysessiond, rejectionrate, accesslist, acesssessions, accesspercentage, searchlist, searchsessions, searchpercentage, countrylist, countrysessions, countrypages, countryrejections, citylist, citysessions, citypages, cityjections, plist, ppageview, ppercentage, pavgtimeonpage, hourslist, hoursessions, pagetrack, ysessions, avgvisitspermonth, monthlist = PDFlist
+		if missing:
+			raise ValueError('Report sections without data: %s' % ', '.join(missing))
+
+		sessionsperday, pagetrack, hourslist, hoursessions = reportdata.sessionsperday, reportdata.pagetrack, reportdata.hours, reportdata.hoursessions
+		accesstop, searchtop, pagestop = reportdata.access.Top(), reportdata.search.Top(), reportdata.pages.Top() # Outros is never chosen below
+		citylist, citysessions = reportdata.city[:2]
 
 		filepath = path.join(folderpath, filename + '.pdf')
 
 		doc = SimpleDocTemplate(filepath)
+		doc.reportdata = reportdata # Read back by the page templates
 		style = getSampleStyleSheet()['Normal']
 		story = [Spacer(1, 2 * inch)]
 		monthdate = [str(x) for x in range(1, int(enddate.split('-')[2]) + 1)]
 		maxhour = hourslist[hoursessions.index(max(hoursessions))]
-		temphours = hourslist
-		tempsessions = hoursessions
+		temphours = list(hourslist) # Copies, the chart below still draws every hour
+		tempsessions = list(hoursessions)
 
 		del temphours[tempsessions.index(max(tempsessions))]
 		del tempsessions[tempsessions.index(max(tempsessions))]
 
 		secmaxhour = temphours[tempsessions.index(max(tempsessions))]
 
-		if len(accesslist) > 1:
-			searchindex = accesslist[0] if '(direct)' not in accesslist[0] else accesslist[1]
+		if len(accesstop) > 1:
+			searchindex = accesstop[0] if '(direct)' not in accesstop[0][0] else accesstop[1]
 
 		else:
-			searchindex = accesslist[0]
+			searchindex = accesstop[0]
 
 		story.append(PageBreak())
 		
@@ -742,19 +783,19 @@ class Report(object):
 		story.append(draw)
 
 		story.append(Paragraph('<br/><br/>', style))
-		story.append(Paragraph('<para alignment="center">No presente mês, o website obteve <b>%s</b> visitas, das quais se identificaram <b>%s</b> visitantes únicos. <br/>O website teve uma média de <b>%s</b> visitas por dia.</para>' % (sessionsum, usersum, avgsessions), style))
+		story.append(Paragraph('<para alignment="center">No presente mês, o website obteve <b>%s</b> visitas, das quais se identificaram <b>%s</b> visitantes únicos. <br/>O website teve uma média de <b>%s</b> visitas por dia.</para>' % (reportdata.sessionsum, reportdata.usersum, reportdata.avgsessions), style))
 		story.append(Paragraph('<br/><br/>', style))
 		story.append(Paragraph('<a name = page3.html#2></a>1.2. Pageviews', sT))
 		story.append(Paragraph('<br/>', pT))
-		story.append(Paragraph('Das <b>%s</b> visitas verificadas, foram visualizadas <b>%s</b> páginas.<br/>Em cada visita foram consultadas, em média, <b>%s</b> páginas.' % (sessionsum, pagevsum, avgpageviews), style))
+		story.append(Paragraph('Das <b>%s</b> visitas verificadas, foram visualizadas <b>%s</b> páginas.<br/>Em cada visita foram consultadas, em média, <b>%s</b> páginas.' % (reportdata.sessionsum, reportdata.pagevsum, reportdata.avgpageviews), style))
 		story.append(Paragraph('<br/><br/>', style))
 		story.append(Paragraph('<a name = page3.html#3></a>1.3. Tempo Médio no Website', sT))
 		story.append(Paragraph('<br/>', pT))
-		story.append(Paragraph('O tempo médio de uma visita no corrente mês foi de <b>%s</b>.' % monthlysessiond, style))
+		story.append(Paragraph('O tempo médio de uma visita no corrente mês foi de <b>%s</b>.' % reportdata.sessionduration, style))
 		story.append(Paragraph('<br/><br/>', style))
 		story.append(Paragraph('<a name = page3.html#4></a>1.4. Taxa de Rejeição', sT))
 		story.append(Paragraph('<br/>', pT))
-		story.append(Paragraph('No mês de Outubro houve uma taxa de rejeição<b>&sup1;</b> de <b>%s</b>.' % rejectionrate, style))
+		story.append(Paragraph('No mês de Outubro houve uma taxa de rejeição<b>&sup1;</b> de <b>%s</b>.' % reportdata.rejectionrate, style))
 		story.append(Paragraph('<br/><br/><br/><br/>', style))
 		story.append(Paragraph('&sup1; - Percentagem de utilizadores que consultaram apenas uma página', sS))
 		story.append(PageBreak())
@@ -763,12 +804,12 @@ class Report(object):
 		story.append(Paragraph('<a name = page4.html#2></a>2. Geografia de Visitantes', pT))
 		story.append(Paragraph('<br/><br/><br/>', style))
 
-		table = Report.TableFormat(['Países', 'Sessões', 'Páginas/Sessões', 'Taxa de Rejeição'], countrylist, countrysessions, countrypages, countryrejections)
+		table = Report.TableFormat(['Países', 'Sessões', 'Páginas/Sessões', 'Taxa de Rejeição'], *reportdata.country)
 		
 		story.append(table)
 		story.append(Paragraph('<br/><br/><br/><br/><br/><br/>', style))
 
-		table = Report.TableFormat(['Cidades', 'Sessões', 'Páginas/Sessões', 'Taxa de Rejeição'], citylist, citysessions, citypages, cityjections)
+		table = Report.TableFormat(['Cidades', 'Sessões', 'Páginas/Sessões', 'Taxa de Rejeição'], *reportdata.city)
 		
 		story.append(table)
 		story.append(PageBreak())
@@ -792,7 +833,7 @@ class Report(object):
 		story.append(Paragraph('<a name = page5.html#4></a>4. Fontes de Acesso ao Website', pT))
 		story.append(Paragraph('<br/><br/><br/>', style))
 
-		table = Report.TableFormat(['Origem', 'Visitas', '% Visitas'], accesslist, acesssessions, accesspercentage)
+		table = Report.TableFormat(['Origem', 'Visitas', '% Visitas'], *reportdata.access.Columns())
 
 		story.append(table)
 		story.append(PageBreak())
@@ -801,7 +842,7 @@ class Report(object):
 		story.append(Paragraph('<a name = page6.html#5></a>5. Palavras-Chave nas Pesquisas nos Motores de Busca', pT))
 		story.append(Paragraph('<br/><br/><br/>', style))
 
-		table = Report.TableFormat(['Palavras-Chave&sup2;', 'Visitas', '% Visitas'], searchlist, searchsessions, searchpercentage)
+		table = Report.TableFormat(['Palavras-Chave&sup2;', 'Visitas', '% Visitas'], *reportdata.search.Columns())
 
 		story.append(table)
 		story.append(Paragraph('<br/><br/><br/>', style))
@@ -838,7 +879,7 @@ class Report(object):
 		story.append(Paragraph('<a name = page7.html#7></a>7. Áreas Visitadas do Website - Ranking por Pageview', pT))
 		story.append(Paragraph('<br/><br/><br/>', style))
 
-		table = Report.TableFormat(['Título da Página', 'Visualizações', '% Visualizações', 'Média (t)'], plist, ppageview, ppercentage, pavgtimeonpage)
+		table = Report.TableFormat(['Título da Página', 'Visualizações', '% Visualizações', 'Média (t)'], *reportdata.pages.Columns())
 		
 		story.append(table)
 		story.append(Paragraph('<br/><br/><br/>', style))
@@ -849,15 +890,15 @@ class Report(object):
 		chart = VerticalBarChart()
 		chart.width = 400
 		chart.height = 170
-		chart.data = [ysessions]
-		chart.categoryAxis.categoryNames = list(monthlist)
+		chart.data = [reportdata.ysessions]
+		chart.categoryAxis.categoryNames = list(reportdata.monthlist)
 		chart.bars[0].fillColor = colors.HexColor('#80ccff', hasAlpha = True)
 		chart.bars[0].strokeColor = colors.white
 		draw.add(chart)
 		story.append(draw)
 
 		story.append(Paragraph('<br/><br/>', style))
-		story.append(Paragraph('<para alignment="center">Verifica-se que o website obteve em média <b>%s</b> visitas por mês.</para>' % avgvisitspermonth, style))
+		story.append(Paragraph('<para alignment="center">Verifica-se que o website obteve em média <b>%s</b> visitas por mês.</para>' % reportdata.avgvisitspermonth, style))
 		story.append(PageBreak())
 
 		story.append(Paragraph('<br/><br/><br/><br/><br/>', style))
@@ -868,16 +909,16 @@ class Report(object):
 		toyear, tomonth = enddate.split('-')[:2]
 		toweekday = weekdays[weekday(int(toyear), int(tomonth), int(primeday))]
 
-		story.append(Paragraph('Em resumo, poderá afirmar-se que o dia mais visitado foi <b>%s de %s (%s)</b> com <b>%s</b> visitas, sendo que o maior número de visitas teve origem de <b>%s</b>.' % (primeday, PDFlist[0][1], toweekday, max(sessionsperday), citylist[citysessions.index(max(citysessions))]), style))
+		story.append(Paragraph('Em resumo, poderá afirmar-se que o dia mais visitado foi <b>%s de %s (%s)</b> com <b>%s</b> visitas, sendo que o maior número de visitas teve origem de <b>%s</b>.' % (primeday, reportdata.month, toweekday, max(sessionsperday), citylist[citysessions.index(max(citysessions))]), style))
 		story.append(Paragraph('<br/><br/>', style))
-		story.append(Paragraph('Por outro lado, <b>%s</b> dos acessos ao website surge através do <b>%s</b> e a palavra-chave mais utilizada foi <b>%s</b>.' % (accesspercentage[accesslist.index(searchindex)], searchindex, searchlist[searchsessions.index(max(searchsessions))]), style)) 
+		story.append(Paragraph('Por outro lado, <b>%s</b> dos acessos ao website surge através do <b>%s</b> e a palavra-chave mais utilizada foi <b>%s</b>.' % (searchindex[2], searchindex[0], searchtop[0][0]), style)) 
 		story.append(Paragraph('<br/><br/>', style))
 
-		if len(plist) > 1:
-			primepage = plist[0] if '(not set)' not in plist[0] else plist[1]
+		if len(pagestop) > 1:
+			primepage = pagestop[0][0] if '(not set)' not in pagestop[0][0] else pagestop[1][0]
 
 		else:
-			primepage = plist[0]
+			primepage = pagestop[0][0]
 
 		story.append(Paragraph('A página mais acedida, além da página inicial, foi a <b>%s</b>, verificando-se que os períodos diários com maior tráfego no website foram às <b>%sh</b> e às <b>%sh</b>.' % (primepage, maxhour, secmaxhour), style))
 
@@ -887,6 +928,8 @@ class Report(object):
 	def FirstPage(canvas, doc):
 
 		height = 120
+		info = doc.reportdata
+		companysite, cellphone = info.contacts
 
 		canvas.saveState()
 
@@ -902,10 +945,10 @@ class Report(object):
 
 		canvas.setFont('Calibri', 32)
 		canvas.drawCentredString(defaultPageSize[0] / 2, defaultPageSize[1] / 2 + 15, "Relatório Mensal de")
-		canvas.drawCentredString(defaultPageSize[0] / 2, defaultPageSize[1] / 2 - 20, '%s %s' % (PDFlist[0][1], PDFlist[0][2]))
+		canvas.drawCentredString(defaultPageSize[0] / 2, defaultPageSize[1] / 2 - 20, '%s %s' % (info.month, info.year))
 		canvas.setFillColorRGB(0, 0, 0.6)
 
-		canvas.drawCentredString(defaultPageSize[0] / 2, defaultPageSize[1] / 2 - 55, PDFlist[0][0])
+		canvas.drawCentredString(defaultPageSize[0] / 2, defaultPageSize[1] / 2 - 55, info.profile)
 
 		canvas.setFont('Times-Roman', 9)
 		canvas.setFillColorRGB(0, 0, 0) # (0, 0.7, 0.9)
@@ -915,6 +958,9 @@ class Report(object):
 
 	def LaterPages(canvas, doc):
 
+		info = doc.reportdata
+		companysite, cellphone = info.contacts
+
 		canvas.saveState()
 
 		heightcenter = ImageFormat(images['header'])
@@ -926,8 +972,8 @@ class Report(object):
 		canvas.drawImage(images['footer']['path'], (defaultPageSize[0] - widthcenter) / 2, 40, widthcenter, preserveAspectRatio = True, mask = 'auto')
 
 		canvas.setFont('Times-Roman', 9)
-		canvas.drawString(70, 1.15 * inch, "Relatório Mensal de Visitas - {}".format(PDFlist[0][1]))
-		canvas.drawRightString(defaultPageSize[0] - 70, 1.15 * inch, "{} {} | Página {}".format(PDFlist[0][2], date.today().strftime('%d-%m-%Y'), doc.page))
+		canvas.drawString(70, 1.15 * inch, "Relatório Mensal de Visitas - {}".format(info.month))
+		canvas.drawRightString(defaultPageSize[0] - 70, 1.15 * inch, "{} {} | Página {}".format(info.year, date.today().strftime('%d-%m-%Y'), doc.page))
 		canvas.drawRightString(defaultPageSize[0] - 70, 1.15 * inch - 15, "{} | Telf: {}".format(companysite, cellphone))
 		canvas.restoreState()
 
@@ -976,166 +1022,1340 @@ class Report(object):
 		return table
 
 
-def OnLoadWorker(pipe):
+class ReportData(object): # What the PDF reads of a profile's worksheets, filled in by each sheet as it is written
 
-	try:
-		service, flags = sample_tools.init(argv, 'analytics', 'v3', __doc__, curdir, scope = 'https://www.googleapis.com/auth/analytics.readonly')
-		
-		profiles = GetProfileInfo(service)
+	__slots__ = ('profile', 'month', 'year', 'contacts',
+		'sessionsperday', 'sessionsum', 'usersum', 'avgsessions', 'pagevsum', 'avgpageviews', 'sessionduration', 'rejectionrate', # Sessões (Gerais)
+		'country', 'city', # Top ten table columns
+		'access', 'search', 'pages', # Rankings, their top entries and the Outros row
+		'hours', 'hoursessions', 'pagetrack', 'ysessions', 'avgvisitspermonth', 'monthlist')
 
-		parameters = []
-				
-		for profileID in profiles:
-			newsite = profiles[profileID][1]
+	def __init__(self, profile, month, year, contacts):
 
-			if 'http' not in newsite[:4]:
-				newsite = 'http://' + profiles[profileID][1]
+		self.profile = profile
+		self.month = month
+		self.year = year
+		self.contacts = contacts
 
-			if '/' not in newsite[-1]:
-				newsite = newsite + '/'
 
-			parameters.append([profileID, profiles[profileID][0], newsite])
+	def Missing(self): # Sections no worksheet has filled in
 
-		pipe.put(parameters, block = True)
+		return [name for name in self.__slots__ if not hasattr(self, name)]
 
-	except TypeError as error: # Handle errors in constructing a query
-		pipe.put('There was an error in constructing your query', block = True)
 
-	except HttpError as error: # Handle API errors
-		pipe.put('There was an API error : %s - %s' % (error.resp.status, error._get_reason()), block = True)
+class Ranking(object): # Top entries of a breakdown and their shares of the total, taken in one pass over rows sorted or not
 
-	except AccessTokenRefreshError: # Handle Auth errors
-		pipe.put('The credentials have been revoked or expired, please re-run the application to re-authorize', block = True)
+	def __init__(self, limit = toplimit, total = None, skip = (), other = None):
 
-	except FileNotFoundError as e: # Handles Name errors
-		pipe.put('A website name has unexpected punctuation or path to files has changed. %s' % e, block = True)
+		self.limit = limit
+		self.total = total # The query total when the rows may not all be fed, otherwise their sum
+		self.skip = skip # Counted in the total but never listed
+		self.other = other # Label of the row closing the columns with whatever the top entries leave out, none without it
+		self.summed = 0
+		self.count = 0
+		self.extras = 0
+		self.last = None
+		self.presorted = True
+		self.entries = [] # In arrival order while the values come sorted, a min heap from the first one out of order
 
-	except PermissionError:
-		pipe.put('The file in question needs to be closed in order to be updated', block = True)
 
-	except Exception as e:
-		pipe.put('%s' % e, block = True)
+	def Add(self, name, value, *extra):
 
-	except KeyboardInterrupt:
-		raise SystemExit
-		
+		self.summed += value
+		self.extras = len(extra)
 
-def GetProfileInfo(service):
+		if name in self.skip:
+			return
 
-	profilesinfo = OrderedDict()
+		entry = (value, -self.count, name, extra) # Ties keep the earlier row
+		self.count += 1
 
-	accounts = service.management().accounts().list().execute()
+		if self.presorted:
+			if self.last is None or value <= self.last:
+				self.last = value
 
-	if accounts.get('items'):
-		for accountNumber in range(0, len(accounts.get('items'))):
-			firstAccountId = accounts.get('items')[accountNumber].get('id')
-			webproperties = service.management().webproperties().list(accountId = firstAccountId).execute()
+				if len(self.entries) < self.limit:
+					self.entries.append(entry)
+
+				return
 
-			if webproperties.get('items'):
-				for webId in webproperties.get('items'):
-					profiles = service.management().profiles().list(accountId = firstAccountId, webPropertyId = webId.get('id')).execute()
+			self.presorted = False
+			heapify(self.entries)
 
-					if profiles.get('items'):
-						profilesinfo[profiles.get('items')[0].get('id')] = (profiles.get('items')[0].get('name'), profiles.get('items')[0].get('websiteUrl'))
-						sleep(0.1)
+		if len(self.entries) < self.limit:
+			heappush(self.entries, entry)
 
-		if webproperties.get('items'):
-			return profilesinfo
+		else:
+			heappushpop(self.entries, entry)
 
-	return None
 
+	def Total(self):
 
-def FilesWriter(pipe, info):
+		return self.summed if self.total is None else self.total
 
-	global PDFlist
 
-	pipe.put('Fetching information from Google Analytics', block = True)
+	def Share(self, value):
 
-	service, flags = sample_tools.init(argv, 'analytics', 'v3', __doc__, curdir, scope = 'https://www.googleapis.com/auth/analytics.readonly')
+		total = self.Total()
 
-	for selectedrow in info:
-		PDFlist = [[selectedrow[1], months[selectedrow[3].split('-')[1]], selectedrow[3].split('-')[0]]]
+		return str(round(value / total * 100)) + '%' if total else '0%'
 
-		wbook = workbook.Workbook()
 
-		counter = 0
+	def Other(self): # Whatever the listed entries leave out of the total
 
-		for stats in group:
-			pstartdate = selectedrow[2]
+		return self.Total() - sum(entry[0] for entry in self.entries)
 
-			if stats == 'yearly':
-				splitdate = selectedrow[3].split('-')
-				pstartdate = str(int(splitdate[0]) - 1).zfill(2) + '-01-01'
 
-				if not splitdate[1] == '12':
-					pstartdate = str(int(splitdate[0]) - 1).zfill(2) + '-' + str(int(splitdate[1]) + 1).zfill(2) + '-01'
+	def Top(self): # Name, value, share and extra values of the ranked entries, largest first and never the other row
 
-			if not len(group[stats]) == 3:
-				group[stats].append(None)
+		top = self.entries if self.presorted else sorted(self.entries, reverse = True)
 
-			results = service.data().ga().get(ids = 'ga:' + selectedrow[0], start_date = pstartdate, end_date = selectedrow[3], dimensions = group[stats][0], 
-				metrics = group[stats][1], sort = group[stats][2]).execute()
+		return [[name, value, self.Share(value)] + list(extra) for value, _, name, extra in top]
 
-			if stats == 'session':
-				company = results.get('profileInfo').get('profileName')
-				pipe.put('Writing %s report and statistics' % company, block = True)
+
+	def Columns(self): # Names, values, shares and extra columns of the top entries, closed by the other row when labelled
+
+		rows = self.Top()
+
+		if self.other and self.Other() > 0:
+			rows.append([self.other, self.Other(), self.Share(self.Other())] + [''] * self.extras)
+
+		return [list(column) for column in zip(*rows)] if rows else [[] for n in range(0, 3 + self.extras)]
+
+
+class RowStream(object): # Google Analytics response decoded as its body arrives, the rows typed one at a time and every other field kept in header
+
+	def __init__(self, http, request, credentials):
+
+		for attempt in range(0, 2): # A token refused before the refresher renewed it is refreshed once
+			headers = dict(request.headers)
+			credentials.apply(headers)
+			response, body = http.request(request.uri, method = request.method, headers = headers, stream = True)
+
+			if response.status != 401 or attempt:
+				break
+
+			credentials.refresh(httplib2.Http())
+
+		if response.status >= 300:
+			raise HttpError(response, body, uri = request.uri)
+
+		self.body = body
+		self.chunks = iter(body)
+		self.decoder = getincrementaldecoder('utf-8')()
+		self.decode = json.JSONDecoder().raw_decode
+		self.buffer = ''
+		self.position = 0
+		self.header = {}
+
+		try:
+			self.Expect('{')
+			self.rows = self.Fields()
+
+		except BaseException: # Closed so the connection is freed and the request timed
+			body.close()
+			raise
+
+
+	def Rows(self): # Typed following the columnHeaders read before the rows, as Google Analytics sends them
+
+		headers = self.header.get('columnHeaders')
+		converters = [int if header.get('dataType') in integertypes else float if header.get('dataType') in floattypes else str for header in headers or []]
+
+		try:
+			while self.rows:
+				character = self.Skip()
+				self.position += 1 if character in ',]' else 0
+
+				if character == ']':
+					self.rows = self.Fields() # Fields sent after the rows
+
+				elif character != ',':
+					row = self.Value()
+
+					yield [convert(value) for convert, value in zip(converters, row)] if converters else row
+
+		finally:
+			self.body.close()
+
+
+	def Fields(self): # Reads fields into header up to the rows, True when they were reached
+
+		while True:
+			character = self.Skip()
+
+			if character == '}':
+				self.position += 1
+				return False
+
+			if character == ',':
+				self.position += 1
+				continue
+
+			key = self.Value()
+			self.Expect(':')
+
+			if key == 'rows':
+				self.Expect('[')
+				return True
+
+			self.header[key] = self.Value()
+
+
+	def Value(self):
+
+		while True:
+			self.Skip() # Not skipped by raw_decode
 
 			try:
-				Statistics.WorksheetGenerator(wbook, results, titles[counter], selectedrow[2], selectedrow[3], pstartdate)
+				value, end = self.decode(self.buffer, self.position)
+
+				if end < len(self.buffer): # Followed by something, so a number was not cut short
+					self.position = end
+					return value
 
 			except ValueError:
-				counter += 1
-				break
+				pass
 
-			counter += 1
+			if not self.More():
+				raise ValueError('Response body ended inside a value')
 
-		counter = 0
 
-	pipe.put('done', block = True)
+	def Expect(self, character):
 
+		if self.Skip() != character:
+			raise ValueError('Expected %r in the response body' % character)
 
-def ImageFormat(image):
+		self.position += 1
 
-	x, y = Image.open(image['path']).size
-	height = y * image['width'] / x
 
-	return height
+	def Skip(self): # The next character that is not whitespace, reading more of the body as needed
+
+		while True:
+			while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\r\n':
+				self.position += 1
+
+			if self.position < len(self.buffer):
+				return self.buffer[self.position]
+
+			if not self.More():
+				raise ValueError('Response body ended early')
+
+
+	def More(self): # Appends the next chunk of the body, dropping what was already decoded
+
+		chunk = next(self.chunks, None)
+
+		if chunk is None:
+			return False
+
+		self.buffer = self.buffer[self.position:] + self.decoder.decode(chunk)
+		self.position = 0
+
+		return True
+
+
+class TypedRows(list): pass # Rows already converted following their columnHeaders, as RowStream yields them
+
+
+class ResultTable(object): # Rows of a query held as typed columns, each value converted once following its columnHeaders dataType
+
+	def __init__(self, headers, rows):
+
+		typed = isinstance(rows, TypedRows) # Only packed into the columns
+
+		self.names = [header.get('name') for header in headers]
+		self.columns = [Column(header.get('dataType', 'STRING'), [row[n] for row in rows], typed) for n, header in enumerate(headers)]
+		self.length = len(rows)
+
+
+	def __len__(self):
+
+		return self.length
+
+
+	def __getitem__(self, column): # Column by position or by name
+
+		return self.columns[column if isinstance(column, int) else self.names.index(column)]
 
 
-def IntegerFormat(data, percentage):
+	def Values(self, column): # Column as a list of Python values
 
-	listlen = len(data)
+		column = self[column]
 
-	if percentage == True:
-		listlen = len(data) - 1
+		return column if isinstance(column, list) else column.tolist()
+
+
+	def Rows(self):
+
+		return zip(*[self.Values(n) for n in range(0, len(self.columns))])
+
+
+	def Sum(self, column): # Summed in one NumPy reduction when the column is an array
+
+		column = self[column]
+
+		return column.sum().item() if numpy and isinstance(column, numpy.ndarray) else sum(column)
+
+
+	def Mean(self, column):
+
+		return self.Sum(column) / self.length
+
+
+class RateLimiter(object): # Token bucket shared by every thread sending Google Analytics requests
+
+	def __init__(self, rate, burst = None):
+
+		self.rate = rate
+		self.burst = burst if burst else rate
+		self.tokens = self.burst
+		self.stamp = monotonic()
+		self.lock = Lock()
+
+
+	def Acquire(self, tokens = 1): # Blocks until the bucket holds enough tokens
+
+		while True:
+			with self.lock:
+				now = monotonic()
+				self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+				self.stamp = now
+
+				if self.tokens >= min(tokens, self.burst): # Requests larger than the bucket leave it owing tokens
+					self.tokens -= tokens
+					return
+
+				wait = (min(tokens, self.burst) - self.tokens) / self.rate
+
+			sleep(wait)
+
+
+class QuotaExhausted(Exception): pass
+
+
+class FileLock(object): # Lock shared between processes, taken over once left behind for stale seconds
+
+	def __init__(self, lockpath, stale = 10):
+
+		self.lockpath = lockpath
+		self.stale = stale
+
+
+	def __enter__(self):
+
+		while True:
+			try:
+				mkdir(self.lockpath) # Atomic on every platform
+
+				return self
+
+			except FileExistsError:
+				try:
+					if time() - path.getmtime(self.lockpath) > self.stale:
+						rmdir(self.lockpath)
+
+				except OSError:
+					pass
+
+				sleep(0.01)
+
+
+	def __exit__(self, *args):
 
-	for num in range(1, listlen):
 		try:
-			data[num] = int(data[num])
+			rmdir(self.lockpath)
 
-		except ValueError:
+		except FileNotFoundError: # Taken over as stale by another process
 			pass
 
-	return data
 
+class QuotaLedger(object): # Requests sent on the current quota day, persisted and summed between processes
 
-def TimeFormat(seconds): # Converting seconds to time format
+	def __init__(self, filepath, limit):
 
-	hours, rest = divmod(round(float(seconds)), 3600) 
-	minutes, seconds = divmod(rest, 60)
+		self.filepath = filepath
+		self.limit = limit
+		self.day = None
+		self.used = 0
+		self.pending = 0
+		self.flushed = monotonic()
+		self.lock = RLock() # Spend and Exhaust flush while holding it
 
-	time = []
 
-	for num in hours, minutes, seconds:
-		if len(str(num)) == 1:
-			num = '0' + str(num)
+	def Spend(self, requests = 1):
 
-		time.append(num)
+		with self.lock:
+			if self.day != QuotaDay():
+				self.Flush()
 
-	return '%s:%s:%s' % (time[0], time[1], time[2])
+			if self.used + self.pending + requests > self.limit:
+				raise QuotaExhausted('The daily Google Analytics quota of %s requests has been used, please try again tomorrow' % self.limit)
 
+			self.pending += requests
+
+			if monotonic() - self.flushed > 5:
+				self.Flush()
+
+
+	def Exhaust(self): # Google Analytics refused a request for the daily limit
+
+		with self.lock:
+			self.pending += max(0, self.limit - self.used - self.pending)
+			self.Flush()
+
+
+	def Flush(self): # Adds the pending requests to the persisted count and reads the other processes ones
+
+		with self.lock: # Engine threads may still be spending
+			with FileLock(self.filepath + '.lock'):
+				try:
+					with open(self.filepath, 'r') as ledger:
+						stored = json.load(ledger)
+
+				except (OSError, ValueError):
+					stored = {}
+
+				day = QuotaDay()
+				used = stored.get('used', 0) if stored.get('day') == day else 0
+
+				if self.day == day: # Requests of a past day are not carried over
+					used += self.pending
+
+				stored = {'day': day, 'used': used}
+				AtomicWrite(self.filepath, json.dumps(stored).encode('utf-8'))
+
+			self.day, self.used, self.pending = stored['day'], stored['used'], 0
+			self.flushed = monotonic()
+
+
+class QuotaScheduler(object): # Every Google Analytics request waits for a token, a profile slot and the daily quota
+
+	def __init__(self, rate, filepath, limit):
+
+		self.bucket = RateLimiter(rate)
+		self.ledger = QuotaLedger(filepath, limit)
+		self.profiles = {}
+		self.lock = Lock()
+
+
+	def Acquire(self, requests = 1):
+
+		self.ledger.Spend(requests)
+		self.bucket.Acquire(requests)
+
+
+	def Wrap(self, http): # Schedules and retries every request sent through http
+
+		if getattr(http, 'scheduled', False):
+			return http
+
+		request = http.request
+
+		@wraps(request) # Keeps the attributes oauth2client sets on the request method
+		def Request(uri, *args, **kwargs):
+
+			semaphore = self.Profile(uri)
+
+			if semaphore is not None:
+				semaphore.acquire()
+
+			try:
+				for attempt in range(0, retries + 1):
+					self.Acquire()
+					response, content = request(uri, *args, **kwargs)
+
+					if attempt == retries or not self.Retryable(response.status, content):
+						return response, content
+
+					sleep(Backoff(attempt))
+
+			finally:
+				if semaphore is not None:
+					semaphore.release()
+
+		http.request = Request
+		http.scheduled = True
+
+		return http
+
+
+	def Profile(self, uri): # Concurrent requests slots of the profile queried by uri
+
+		profile = re.search(r'ids=ga(?:%3A|:)(\d+)', uri)
+
+		if profile is None:
+			return None
+
+		with self.lock:
+			return self.profiles.setdefault(profile.group(1), BoundedSemaphore(profileconcurrency))
+
+
+	def Retryable(self, status, content):
+
+		if status == 429 or status >= 500:
+			return True
+
+		if status == 403:
+			try:
+				reasons = [error.get('reason') for error in json.loads(content.decode('utf-8')).get('error').get('errors')]
+
+			except (AttributeError, TypeError, ValueError):
+				return False
+
+			if 'dailyLimitExceeded' in reasons:
+				self.ledger.Exhaust()
+
+			return any(reason in retryreasons for reason in reasons)
+
+		return False
+
+
+class Listing(object): # Paginated management listing, executed like a single request
+
+	def __init__(self, method, **kwargs):
+
+		self.method = method
+		self.kwargs = kwargs
+
+
+	def execute(self, http = None):
+
+		items, startindex = [], 1
+
+		while True:
+			page = self.method(start_index = startindex, max_results = listlimit, **self.kwargs).execute(http = http)
+			items.extend(page.get('items', []))
+
+			if not page.get('nextLink') or not page.get('items'):
+				return items
+
+			startindex += len(page.get('items'))
+
+
+class ResultCache(object): # Query results on disk, kept in a shared file cache that evicts the least recently used once over budget bytes
+
+	def __init__(self, directory, budget):
+
+		self.directory = directory
+		self.budget = budget
+		self.store = None
+		self.lock = Lock()
+
+
+	def Get(self, params):
+
+		key = self.Key(params)
+
+		try:
+			entry = json.loads(self.Store().get(key).decode('utf-8'))
+
+		except (AttributeError, OSError, ValueError): # Missing or unreadable
+			return None
+
+		if entry.get('expires') is not None and entry.get('expires') < time():
+			self.Store().delete(key)
+
+			return None
+
+		return entry.get('results')
+
+
+	def Set(self, params, results):
+
+		expires = None if Settled(params['end_date']) else time() + cachettl # Settled ranges never change
+
+		self.Store().set(self.Key(params), json.dumps({'expires': expires, 'results': results}).encode('utf-8'))
+
+
+	def Store(self): # Created on first use, so importing never writes to the install directory
+
+		with self.lock:
+			if self.store is None:
+				self.store = httplib2.SharedFileCache(self.directory, self.budget)
+
+		return self.store
+
+
+	def Key(self, params): # Keyed by profile, query and date range
+
+		return json.dumps(params, sort_keys = True)
+
+
+class MonthlyStore(object): # Settled monthly session totals per profile, so the yearly window only queries what is missing
+
+	def __init__(self, directory):
+
+		self.directory = directory
+
+
+	def Params(self, selectedrow): # Query for the missing months of the window, None when every month is stored
+
+		missing = self.Missing(selectedrow)
+
+		if not missing:
+			return None
+
+		return {'ids': 'ga:' + selectedrow[0], 'start_date': missing[0][:4] + '-' + missing[0][4:] + '-01', 'end_date': selectedrow[3], 
+			'dimensions': group['yearly'][0], 'metrics': group['yearly'][1], 'sort': None}
+
+
+	def Merge(self, selectedrow, results): # Stores the settled months of results and returns the whole window
+
+		stored = self.Load(selectedrow[0])
+		window = MonthWindow(selectedrow[3])
+		missing = self.Missing(selectedrow)
+		values = dict(stored['months'])
+
+		if results is not None and missing:
+			fetched = dict((row[0], row[1]) for row in results.get('rows', []))
+
+			for month in window[window.index(missing[0]):]:
+				values[month] = fetched.get(month, '0')
+
+				if self.Complete(month, selectedrow[3]):
+					stored['months'][month] = values[month]
+
+			stored['profileInfo'] = results.get('profileInfo')
+			self.Save(selectedrow[0], stored)
+
+		return {'profileInfo': stored['profileInfo'], 'columnHeaders': [{'name': 'ga:month', 'dataType': 'STRING'}, {'name': 'ga:sessions', 'dataType': 'INTEGER'}], 
+			'rows': [[month, values[month]] for month in window]}
+
+
+	def Missing(self, selectedrow):
+
+		stored = self.Load(selectedrow[0])
+
+		if stored['profileInfo'] is None:
+			return MonthWindow(selectedrow[3])
+
+		return [month for month in MonthWindow(selectedrow[3]) if month not in stored['months'] or not self.Complete(month, selectedrow[3])]
+
+
+	def Complete(self, month, enddate): # Whether the month is fully inside the range and settled
+
+		lastday = '%s-%s-%02d' % (month[:4], month[4:], monthrange(int(month[:4]), int(month[4:]))[1])
+
+		return lastday <= enddate and Settled(lastday)
+
+
+	def Load(self, profile):
+
+		try:
+			with open(path.join(self.directory, profile + '.json'), 'r', encoding = 'utf-8') as stored:
+				return json.load(stored)
+
+		except (OSError, ValueError):
+			return {'profileInfo': None, 'months': {}}
+
+
+	def Save(self, profile, stored):
+
+		makedirs(self.directory, exist_ok = True)
+		AtomicWrite(path.join(self.directory, profile + '.json'), json.dumps(stored).encode('utf-8'))
+
+
+class FetchEngine(object): # Keeps up to concurrency queries in flight on an asyncio loop
+
+	def __init__(self, service, concurrency = inflight, http = None):
+
+		self.service = service
+		self.concurrency = min(concurrency, (http or service._http).connections.maxsize) # Every query goes to the same host
+		self.http = http
+
+
+	def Run(self, queries, consumer): # Calls consumer(key, results) for each query as soon as it completes, one at a time on a writer thread
+
+		loop = asyncio.new_event_loop()
+		executor = ThreadPoolExecutor(max_workers = self.concurrency)
+		writer = ThreadPoolExecutor(max_workers = 1) # Writing reports and paging queries never holds up the loop
+
+		async def Fetch(semaphore, key):
+
+			async with semaphore:
+				results = await loop.run_in_executor(executor, self.Execute, queries[key])
+
+			return key, results
+
+		async def Gather():
+
+			semaphore = asyncio.Semaphore(self.concurrency)
+			tasks = [asyncio.ensure_future(Fetch(semaphore, key)) for key in queries]
+			consumed = []
+
+			try:
+				for task in asyncio.as_completed(tasks):
+					key, results = await task
+					consumed.append(loop.run_in_executor(writer, consumer, key, results))
+
+				await asyncio.gather(*consumed)
+
+			finally:
+				for task in tasks:
+					task.cancel()
+
+		try:
+			loop.run_until_complete(Gather())
+
+		finally:
+			executor.shutdown(wait = False)
+			writer.shutdown(wait = True)
+			loop.close()
+
+
+	def Execute(self, request): # Runs in the executor threads, sharing the connection pool of the service or of http
+
+		return request.execute(http = self.http)
+
+
+class ProfileReport(object): # Feeds a profile's results to the worksheet generator in group order, as they arrive
+
+	def __init__(self, pipe, selectedrow, contacts):
+
+		self.pipe = pipe
+		self.selectedrow = selectedrow
+		self.reportdata = ReportData(selectedrow[1], months[selectedrow[3].split('-')[1]], selectedrow[3].split('-')[0], contacts)
+		self.wbook = workbook.Workbook()
+		self.pending = {}
+		self.counter = 0
+		self.stopped = False
+
+
+	def Consume(self, stats, results):
+
+		self.pending[stats] = results
+		order = list(group)
+
+		while not self.stopped and self.counter < len(order) and order[self.counter] in self.pending:
+			stats = order[self.counter]
+			results = self.pending.pop(stats)
+
+			if stats == 'session':
+				company = results.get('profileInfo').get('profileName')
+				self.pipe.put('Writing %s report and statistics' % company, block = True)
+
+			try:
+				Statistics.WorksheetGenerator(self.wbook, results, titles[self.counter], self.selectedrow[2], self.selectedrow[3], self.reportdata)
+
+			except ValueError:
+				self.stopped = True
+
+			self.counter += 1
+
+		if self.stopped or self.counter == len(order): # Frees the report as soon as it is written
+			self.pending.clear()
+			self.wbook = None
+			self.reportdata = None
+
+
+class Session(object): # One authenticated service per process, its access token refreshed in the background before expiring
+
+	def __init__(self, margin = refreshmargin):
+
+		self.margin = margin
+		self.service = None
+		self.management = None
+		self.streamer = None
+		self.credentials = None
+		self.lock = Lock()
+
+
+	def Service(self): # Built on first use, every later call returns the same service
+
+		with self.lock:
+			if self.service is None:
+				bundled = path.exists(discoverypath) # Built offline from the bundled discovery document when there is one
+				start = monotonic()
+
+				if self.credentials is None: # Reads the stored credentials or runs the authorization flow
+					self.service, flags = sample_tools.init(argv, 'analytics', 'v3', __doc__, curdir, scope = 'https://www.googleapis.com/auth/analytics.readonly', 
+						discovery_filename = discoverypath if bundled else None)
+					self.credentials = self.service._http.request.credentials
+
+				elif bundled:
+					with open(discoverypath, 'r') as document:
+						self.service = discovery.build_from_document(document.read(), http = self.credentials.authorize(httplib2.Http()))
+
+				else:
+					self.service = discovery.build('analytics', 'v3', http = self.credentials.authorize(httplib2.Http()))
+
+				logger.info('Analytics service built in %.3f seconds from the %s discovery document', monotonic() - start, 'bundled' if bundled else 'downloaded')
+
+				scheduler.Wrap(self.service._http)
+				self.service._http.timing_hooks.append(timings)
+				Thread(target = self.Refresher, daemon = True).start()
+
+				if discoveryrefresh:
+					Thread(target = self.Discovery, daemon = True).start()
+
+		return self.service
+
+
+	def Management(self): # Authorized http with a response cache, unchanged management listings come back as 304s and new ones are cached in the background
+
+		self.Service()
+
+		with self.lock:
+			if self.management is None:
+				cache = httplib2.MemoryCache(backing = httplib2.SharedFileCache(httpcachepath, httpcachesize))
+				self.management = scheduler.Wrap(self.credentials.authorize(httplib2.Http(cache = cache, cache_write_behind = True)))
+				self.management.timing_hooks.append(timings)
+
+		return self.management
+
+
+	def Stream(self, request): # Opens request as a row stream, over its own http since the authorized one reads whole bodies
+
+		self.Service()
+
+		with self.lock:
+			if self.streamer is None:
+				self.streamer = scheduler.Wrap(httplib2.Http())
+				self.streamer.timing_hooks.append(timings)
+
+		return RowStream(self.streamer, request, self.credentials)
+
+
+	def Close(self): # Writes out the pending cache updates and closes the idle connections, every http starts over on its next request
+
+		with self.lock:
+			for http in (self.service._http if self.service else None, self.management, self.streamer):
+				if http is not None:
+					http.close()
+
+
+	def Discovery(self): # Replaces the bundled discovery document with the current one
+
+		try:
+			response, content = httplib2.Http().request(discoveryurl)
+
+			if response.status == 200:
+				json.loads(content.decode('utf-8')) # Never replaces the bundled copy with a broken one
+				AtomicWrite(discoverypath, content)
+
+		except (httplib2.HttpLib2Error, OSError, ValueError) as e: # The bundled copy keeps working
+			logger.warning('Discovery document refresh failed: %s', e)
+
+
+	def Adopt(self, credentials): # Credentials handed over by the main process, as json
+
+		self.credentials = OAuth2Credentials.from_json(credentials)
+
+
+	def Credentials(self):
+
+		self.Service()
+
+		return self.credentials.to_json()
+
+
+	def Refresher(self): # Refreshes the token margin seconds before it expires, so no request waits on it
+
+		while True:
+			expiry = self.credentials.token_expiry
+
+			if expiry is None: # Unknown expiry, the token is refreshed when a request is refused
+				sleep(self.margin)
+				continue
+
+			remaining = (expiry - datetime.utcnow()).total_seconds()
+
+			if remaining > self.margin:
+				sleep(remaining - self.margin)
+				continue
+
+			try:
+				self.credentials.refresh(httplib2.Http())
+
+			except (AccessTokenRefreshError, httplib2.HttpLib2Error, OSError): # Tried again shortly, requests still refresh on their own
+				sleep(backoff * 2 ** retries)
+
+
+logger = logging.getLogger('analytical')
+timings = httplib2.TimingHistogram() # Network timings of the requests sent since the last batch
+scheduler = QuotaScheduler(ratelimit, quotapath, dailyquota)
+session = Session()
+resultcache = ResultCache(cachepath, cachesize)
+monthlystore = MonthlyStore(monthlypath)
+
+
+def OnLoadWorker(pipe):
+
+	try:
+		service = session.Service()
+		
+		profiles = GetProfileInfo(service)
+
+		parameters = []
+				
+		for profileID in profiles:
+			newsite = profiles[profileID][1]
+
+			if 'http' not in newsite[:4]:
+				newsite = 'http://' + profiles[profileID][1]
+
+			if '/' not in newsite[-1]:
+				newsite = newsite + '/'
+
+			parameters.append([profileID, profiles[profileID][0], newsite])
+
+		pipe.put(parameters, block = True)
+
+	except TypeError as error: # Handle errors in constructing a query
+		pipe.put('There was an error in constructing your query', block = True)
+
+	except HttpError as error: # Handle API errors
+		pipe.put('There was an API error : %s - %s' % (error.resp.status, error._get_reason()), block = True)
+
+	except AccessTokenRefreshError: # Handle Auth errors
+		pipe.put('The credentials have been revoked or expired, please re-run the application to re-authorize', block = True)
+
+	except FileNotFoundError as e: # Handles Name errors
+		pipe.put('A website name has unexpected punctuation or path to files has changed. %s' % e, block = True)
+
+	except PermissionError:
+		pipe.put('The file in question needs to be closed in order to be updated', block = True)
+
+	except QuotaExhausted as e: # Handles the daily quota
+		pipe.put('%s' % e, block = True)
+
+	except Exception as e:
+		pipe.put('%s' % e, block = True)
+
+	except KeyboardInterrupt:
+		raise SystemExit
+
+	finally:
+		scheduler.ledger.Flush()
+		session.Close() # The listings cached in the background are written out before the interface reads them
+		
+
+def GetProfileInfo(service, summaries = True):
+
+	profilesinfo = OrderedDict()
+	http = session.Management() # Revalidates the listings of the last run instead of downloading them again
+
+	if summaries: # The whole account tree in a single paginated listing
+		try:
+			for account in Listing(service.management().accountSummaries().list).execute(http = http):
+				for webproperty in account.get('webProperties', []):
+					if webproperty.get('profiles'):
+						profile = webproperty.get('profiles')[0]
+						profilesinfo[profile.get('id')] = (profile.get('name'), webproperty.get('websiteUrl'))
+
+			return profilesinfo if profilesinfo else None
+
+		except HttpError: # Walks the account tree instead
+			profilesinfo.clear()
+
+	engine = FetchEngine(service, ratelimit, http)
+	accounts = Listing(service.management().accounts().list).execute(http = http)
+	webproperties, profiles = {}, {}
+
+	engine.Run(OrderedDict((account.get('id'), Listing(service.management().webproperties().list, accountId = account.get('id'))) for account in accounts), 
+		webproperties.__setitem__)
+
+	queries = OrderedDict()
+
+	for account in accounts:
+		for webId in webproperties[account.get('id')]:
+			queries[(account.get('id'), webId.get('id'))] = Listing(service.management().profiles().list, accountId = account.get('id'), webPropertyId = webId.get('id'))
+
+	engine.Run(queries, profiles.__setitem__)
+
+	for key in queries: # Keeps the accounts and webproperties order
+		if profiles[key]:
+			profilesinfo[profiles[key][0].get('id')] = (profiles[key][0].get('name'), profiles[key][0].get('websiteUrl'))
+
+	return profilesinfo if profilesinfo else None
+
+
+def FilesWriter(pipe, info, contacts, processes = workers, concurrency = inflight, serial = serial):
+
+	pipe.put('Fetching information from Google Analytics', block = True)
+
+	message = 'done'
+
+	try:
+		processes = min(processes or Workers(len(info)), len(info))
+
+		if serial:
+			processes, concurrency = 1, 0
+
+		if processes > 1: # Each profile is fetched and written in its own worker process
+			with Manager() as manager: # Shut down even when a worker fails
+				progress = manager.Queue()
+
+				with ProcessPoolExecutor(max_workers = processes, initializer = WorkerInit, initargs = (processes, session.Credentials())) as executor:
+					jobs = [executor.submit(ProfileWriter, progress, None, selectedrow, contacts) for selectedrow in info]
+
+					while not all(job.done() for job in jobs) or not progress.empty(): # Relays the workers progress to the interface
+						try:
+							pipe.put(progress.get(timeout = 0.1), block = True)
+
+						except Empty:
+							pass
+
+					for job in jobs: # Raises any worker error in this thread
+						job.result()
+
+		elif concurrency > 0: # Every query of every profile is kept in flight by the fetch engine
+			service = session.Service()
+
+			reports = [ProfileReport(pipe, selectedrow, contacts) for selectedrow in info]
+			queries = OrderedDict()
+
+			for n in range(0, len(info)):
+				for stats, params in ProfileParams(info[n]).items():
+					results = None if params is None else resultcache.Get(params)
+
+					if params is not None and results is None:
+						queries[(n, stats)] = params
+
+					else:
+						reports[n].Consume(stats, Completed(service, stats, info[n], params, results))
+
+			def Store(key, results):
+
+				resultcache.Set(queries[key], results)
+				reports[key[0]].Consume(key[1], Completed(service, key[1], info[key[0]], queries[key], results))
+
+			FetchEngine(service, concurrency).Run(OrderedDict((key, service.data().ga().get(**params)) for key, params in queries.items()), Store)
+
+		else: # One profile at a time, its queries sent as batches
+			service = session.Service()
+
+			for selectedrow in info:
+				ProfileWriter(pipe, service, selectedrow, contacts)
+
+	except QuotaExhausted as e: # Handles the daily quota
+		message = '%s' % e
+
+	except HttpError as error: # Handle API errors
+		message = 'There was an API error : %s - %s' % (error.resp.status, error._get_reason())
+
+	except AccessTokenRefreshError: # Handle Auth errors
+		message = 'The credentials have been revoked or expired, please re-run the application to re-authorize'
+
+	except PermissionError:
+		message = 'The file in question needs to be closed in order to be updated'
+
+	except Exception as e:
+		logger.exception('Writing the reports failed')
+		message = '%s' % e
+
+	finally: # The interface shows the last message, the error when the writer stopped early
+		scheduler.ledger.Flush()
+		LogTimings()
+		pipe.put(message, block = True)
+
+
+def ProfileWriter(pipe, service, selectedrow, contacts):
+
+	worker = service is None
+
+	if worker: # Worker processes build their own service, from the main process credentials
+		service = session.Service()
+
+	report = ProfileReport(pipe, selectedrow, contacts)
+	queries = OrderedDict()
+
+	for stats, params in ProfileParams(selectedrow).items(): # Only the queries missing from the cache reach the API
+		results = None if params is None else resultcache.Get(params)
+
+		if params is not None and results is None:
+			queries[stats] = params
+
+		else:
+			report.Consume(stats, Completed(service, stats, selectedrow, params, results))
+
+	for stats, results in BatchFetch(service, OrderedDict((stats, service.data().ga().get(**params)) for stats, params in queries.items())).items():
+		resultcache.Set(queries[stats], results)
+		report.Consume(stats, Completed(service, stats, selectedrow, queries[stats], results))
+
+	scheduler.ledger.Flush() # Worker processes exit without running atexit handlers
+
+	if worker:
+		LogTimings()
+
+
+def ProfileParams(selectedrow): # The group queries of a profile, as service.data().ga().get arguments, None when nothing needs fetching
+
+	params = OrderedDict()
+
+	for stats in group:
+		if stats == 'yearly':
+			params[stats] = monthlystore.Params(selectedrow)
+			continue
+
+		pstartdate, penddate = QueryDates(stats, selectedrow)
+		sort = group[stats][2] if len(group[stats]) == 3 else None
+
+		params[stats] = QueryPlan(stats, {'ids': 'ga:' + selectedrow[0], 'start_date': pstartdate, 'end_date': penddate, 'dimensions': group[stats][0], 
+			'metrics': group[stats][1], 'sort': sort})
+
+	return params
+
+
+def QueryPlan(stats, params, plan = fidelity): # Rewrites a group query to fetch only what the reports read
+
+	params = dict(params)
+	params['dimensions'] = folded.get(params['dimensions'], params['dimensions'])
+	rows = sheetrows.get(stats) if plan == 'full' else reportrows.get(stats)
+
+	if rows:
+		params['max_results'] = rows
+
+	elif stats in paginated:
+		params['max_results'] = pagesize
+
+	return params
+
+
+def QueryDates(stats, selectedrow):
+
+	pstartdate = selectedrow[2]
+
+	if stats == 'yearly':
+		firstmonth = MonthWindow(selectedrow[3])[0]
+		pstartdate = firstmonth[:4] + '-' + firstmonth[4:] + '-01'
+
+	return pstartdate, selectedrow[3]
+
+
+def MonthWindow(enddate, length = 12): # The yearMonth values of the length months ending in enddate
+
+	year, month = int(enddate[:4]), int(enddate[5:7])
+	window = []
+
+	for n in range(0, length):
+		window.insert(0, '%04d%02d' % (year, month))
+		year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+
+	return window
+
+
+def Completed(service, stats, selectedrow, params, results): # Fills the yearly window from the monthly store and pages the paginated queries
+
+	if stats == 'yearly':
+		return monthlystore.Merge(selectedrow, results)
+
+	if stats in paginated and params.get('max_results') == pagesize and results.get('totalResults', 0) > len(results.get('rows', [])):
+		results['pages'] = PageRows(service, params, results)
+
+	return results
+
+
+def PageRows(service, params, results): # Yields the rows of a paginated query a page at a time, starting with the fetched one
+
+	rows = results.pop('rows', [])
+	startindex = len(rows) + 1
+	totalresults = results.get('totalResults', 0)
+
+	yield rows
+
+	while startindex <= totalresults:
+		pageparams = dict(params, start_index = startindex)
+		page = resultcache.Get(pageparams)
+
+		if page is None and streaming: # Never held whole, streamrows rows at a time
+			rows = session.Stream(service.data().ga().get(**pageparams)).Rows()
+			count = 0
+
+			for batch in iter(lambda: TypedRows(islice(rows, streamrows)), []): # Typed as they were decoded
+				count += len(batch)
+
+				yield batch
+
+			if not count:
+				return
+
+			startindex += count
+			continue
+
+		if page is None:
+			page = service.data().ga().get(**pageparams).execute()
+			resultcache.Set(pageparams, page)
+
+		rows = page.get('rows', [])
+
+		if not rows:
+			return
+
+		yield rows
+
+		startindex += len(rows)
+		del page, rows # Only one page is held at a time
+
+
+def Pages(results): # The rows of a query as a sequence of pages
+
+	return results.get('pages') or [results.get('rows', [])]
+
+
+def BatchFetch(service, queries): # Sends the queries as multipart batch calls, one round trip per batchlimit queries
+
+	keys = list(queries)
+	responses, errors = {}, {}
+	pending = [str(index) for index in range(0, len(keys))]
+
+	def Collect(requestid, response, exception):
+
+		if exception is not None:
+			errors[requestid] = exception
+
+		else:
+			responses[requestid] = response
+
+	for attempt in range(0, retries + 1):
+		for n in range(0, len(pending), batchlimit):
+			batch = service.new_batch_http_request(callback = Collect)
+
+			for requestid in pending[n:n + batchlimit]:
+				batch.add(queries[keys[int(requestid)]], request_id = requestid)
+
+			scheduler.Acquire(len(pending[n:n + batchlimit]) - 1) # The batch call itself takes the first token
+			batch.execute()
+
+		pending = [requestid for requestid in pending if requestid in errors]
+
+		if not pending:
+			break
+
+		for requestid in pending: # Handled as if the query had been executed on its own
+			if attempt == retries or not scheduler.Retryable(errors[requestid].resp.status, errors[requestid].content):
+				raise errors[requestid]
+
+		errors.clear()
+		sleep(Backoff(attempt))
+
+	return OrderedDict((keys[index], responses[str(index)]) for index in range(0, len(keys)))
+
+
+def WorkerInit(processes, credentials): # Shares the per user rate and the session credentials with the report processes
+
+	LogSetup()
+	session.Adopt(credentials)
+	scheduler.bucket.rate = ratelimit / processes
+	scheduler.bucket.burst = scheduler.bucket.tokens = max(1, ratelimit / processes)
+
+
+def AtomicWrite(filepath, data): # Written beside filepath and renamed over it, so readers in other processes never see a partial file
+
+	temporary = '%s.%s.%s.tmp' % (filepath, getpid(), get_ident())
+
+	try:
+		with open(temporary, 'wb') as written:
+			written.write(data)
+
+		replace(temporary, filepath)
+
+	except OSError:
+		if path.exists(temporary):
+			remove(temporary)
+
+		raise
+
+
+def Workers(profiles): # Report processes by default, each one left with at least a full batch of the per user rate
+
+	return max(1, min(cpu_count(), profiles, ratelimit // batchlimit))
+
+
+def LogSetup():
+
+	try:
+		logging.basicConfig(filename = logpath, level = logging.INFO, format = '%(asctime)s %(process)d %(levelname)s %(message)s')
+
+	except OSError: # Installed where the user can not write, nothing is logged
+		pass
+
+
+def LogTimings(): # Where the time of the requests went, so slow batches can be told apart
+
+	if timings.requests:
+		logger.info('Google Analytics requests\n%s', timings.dump())
+		timings.reset()
+
+
+def Backoff(attempt): # Exponential backoff with full jitter
+
+	return uniform(0, backoff * 2 ** attempt)
+
+
+def QuotaDay(): # Midnight Pacific time, following daylight saving when the time zone database is available
+
+	if ZoneInfo:
+		try:
+			return datetime.now(ZoneInfo(quotazone)).strftime('%Y-%m-%d')
+
+		except KeyError: # No time zone database, as on Windows without tzdata
+			pass
+
+	return (datetime.utcnow() + timedelta(hours = quotaoffset)).strftime('%Y-%m-%d')
+
+
+def Column(datatype, values, typed = False): # Compact typed column, a NumPy array when it is installed
+
+	if datatype in integertypes:
+		return numpy.array(values, dtype = numpy.int64) if numpy else array('q', values if typed else map(int, values))
+
+	if datatype in floattypes:
+		return numpy.array(values, dtype = numpy.float64) if numpy else array('d', values if typed else map(float, values))
+
+	return list(values)
+
+
+def DateColumn(days): # ga:date values as YYYY-MM-DD, the dashes inserted over the whole column at once with NumPy
+
+	if numpy and len(days):
+		characters = numpy.array(days, dtype = 'U8').view('U1').reshape(-1, 8)
+
+		return numpy.insert(characters, [4, 6], '-', axis = 1).view('U10').ravel().tolist()
+
+	return ['%s-%s-%s' % (day[:4], day[4:6], day[6:8]) for day in days]
+
+
+def Total(results, column): # Total of a metric column over every row of the query, not just the ones returned
+
+	return int(float(results.get('totalsForAllResults').get(results.get('columnHeaders')[column]['name'])))
+
+
+def Settled(enddate): # Whether Google Analytics has finished processing a range ending in enddate
+
+	return enddate < (date.today() - timedelta(days = processingdays)).isoformat()
+
+
+def ImageFormat(image):
+
+	x, y = Image.open(image['path']).size
+	height = y * image['width'] / x
+
+	return height
+
+
+def TimeFormat(seconds): # Converting seconds to time format
+
+	hours, rest = divmod(round(seconds), 3600) 
+	minutes, seconds = divmod(rest, 60)
+
+	time = []
+
+	for num in hours, minutes, seconds:
+		if len(str(num)) == 1:
+			num = '0' + str(num)
+
+		time.append(num)
+
+	return '%s:%s:%s' % (time[0], time[1], time[2])
+
+
+if __name__ == '__main__':
+	freeze_support() # Lets the frozen executable start the report worker processes
+
+	LogSetup()
 
-if __name__ == '__main__':
 	if not path.exists(folderpath) and (shell.IsUserAnAdmin() or not frozen):
 		makedirs(folderpath)
 
@@ -14,8 +14,9 @@ def SetupBuild():
     curpath = path.dirname(path.realpath(argv[0]))
     filpath = path.join(curpath, 'Others')
     apppath = path.join(curpath, app)
+    discovery = path.join(filpath, 'analytics.json') # Committed copy, so the service is built without downloading it
 
-    build_options = {'include_files': [(certs.where(), 'cacerts.txt'), 'Images'], 'include_msvcr': True}
+    build_options = {'include_files': [(certs.where(), 'cacerts.txt'), 'Images', (discovery, 'Others/analytics.json')], 'include_msvcr': True}
 
     setup(
         name = app.capitalize(),
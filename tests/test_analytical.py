@@ -0,0 +1,158 @@
+import json
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'Modules'))
+
+try: # Needs the Windows, GUI and Google packages the application runs with
+	import analytical
+
+except ImportError as e:
+	raise unittest.SkipTest('analytical can not be imported: %s' % e)
+
+
+class RankingTest(unittest.TestCase):
+
+	def test_presorted_rows_are_kept_in_order(self):
+
+		ranking = analytical.Ranking(2)
+
+		for name, value in [('a', 30), ('b', 20), ('c', 20), ('d', 10)]:
+			ranking.Add(name, value)
+
+		self.assertTrue(ranking.presorted)
+		self.assertEqual([row[:2] for row in ranking.Top()], [['a', 30], ['b', 20]])
+		self.assertEqual(ranking.Total(), 80)
+
+	def test_unsorted_rows_switch_to_the_heap(self):
+
+		ranking = analytical.Ranking(3)
+
+		for name, value in [('a', 5), ('b', 50), ('c', 10), ('d', 40), ('e', 10)]:
+			ranking.Add(name, value)
+
+		self.assertFalse(ranking.presorted)
+		self.assertEqual([row[:2] for row in ranking.Top()], [['b', 50], ['d', 40], ['c', 10]]) # Ties keep the earlier row
+
+	def test_other_row_closes_the_columns(self):
+
+		ranking = analytical.Ranking(2, 100, other = 'Outros')
+
+		for name, value in [('a', 50), ('b', 30), ('c', 15)]:
+			ranking.Add(name, value)
+
+		self.assertEqual(ranking.Columns(), [['a', 'b', 'Outros'], [50, 30, 20], ['50%', '30%', '20%']])
+		self.assertEqual([row[0] for row in ranking.Top()], ['a', 'b'])
+
+	def test_no_other_row_when_nothing_is_left_out(self):
+
+		ranking = analytical.Ranking(2, other = 'Outros')
+
+		for name, value in [('a', 3), ('b', 1)]:
+			ranking.Add(name, value)
+
+		self.assertEqual(ranking.Columns()[0], ['a', 'b'])
+
+	def test_skipped_rows_count_in_the_total_only(self):
+
+		ranking = analytical.Ranking(2, skip = ('(not set)',))
+
+		for name, value in [('a', 6), ('(not set)', 3), ('b', 1)]:
+			ranking.Add(name, value)
+
+		self.assertEqual(ranking.Columns(), [['a', 'b'], [6, 1], ['60%', '10%']])
+
+
+class FakeBody(object):
+
+	def __init__(self, chunks):
+
+		self.chunks = chunks
+		self.closed = False
+
+	def __iter__(self):
+
+		return iter(self.chunks)
+
+	def close(self):
+
+		self.closed = True
+
+
+class RowStreamTest(unittest.TestCase):
+
+	def Stream(self, document, size, cut = 0):
+
+		data = json.dumps(document, ensure_ascii = False).encode('utf-8')
+		data = data[:len(data) - cut]
+		body = FakeBody([data[n:n + size] for n in range(0, len(data), size)])
+		http = mock.Mock()
+		http.request.return_value = (mock.Mock(status = 200), body)
+		request = mock.Mock(uri = 'https://www.googleapis.com/analytics/v3/data/ga', method = 'GET', headers = {})
+
+		return analytical.RowStream(http, request, mock.Mock()), body
+
+	def test_rows_are_decoded_and_typed_as_chunks_arrive(self):
+
+		document = {'kind': 'analytics#gaData', 'columnHeaders': [{'name': 'ga:city', 'dataType': 'STRING'}, {'name': 'ga:sessions', 'dataType': 'INTEGER'},
+			{'name': 'ga:bounceRate', 'dataType': 'PERCENT'}], 'rows': [['Évora', '12', '40.5'], ['Lisboa', '7', '10']], 'totalsForAllResults': {'ga:sessions': '19'}}
+
+		for size in (1, 3, 64):
+			stream, body = self.Stream(document, size)
+
+			self.assertEqual(list(stream.Rows()), [['Évora', 12, 40.5], ['Lisboa', 7, 10.0]])
+			self.assertEqual(stream.header['totalsForAllResults'], {'ga:sessions': '19'}) # Read after the rows
+			self.assertTrue(body.closed)
+
+	def test_response_without_rows(self):
+
+		stream, body = self.Stream({'columnHeaders': [], 'totalResults': 0}, 5)
+
+		self.assertEqual(list(stream.Rows()), [])
+		self.assertEqual(stream.header['totalResults'], 0)
+
+	def test_body_ending_early_fails(self):
+
+		stream, body = self.Stream({'columnHeaders': [], 'rows': [['a'], ['b']]}, 4, cut = 8)
+
+		with self.assertRaises(ValueError):
+			list(stream.Rows())
+
+		self.assertTrue(body.closed)
+
+
+class QuotaDayTest(unittest.TestCase):
+
+	def test_pacific_day(self):
+
+		if analytical.ZoneInfo is None:
+			self.skipTest('zoneinfo is not available')
+
+		self.assertEqual(analytical.QuotaDay(), datetime.now(analytical.ZoneInfo('America/Los_Angeles')).strftime('%Y-%m-%d'))
+
+	def test_fixed_offset_without_zoneinfo(self):
+
+		with mock.patch.object(analytical, 'ZoneInfo', None):
+			self.assertEqual(analytical.QuotaDay(), (datetime.utcnow() + timedelta(hours = analytical.quotaoffset)).strftime('%Y-%m-%d'))
+
+
+class MonthWindowTest(unittest.TestCase):
+
+	def test_window_crosses_the_year(self):
+
+		self.assertEqual(analytical.MonthWindow('2026-02-28', 4), ['202511', '202512', '202601', '202602'])
+
+	def test_default_window_is_a_year(self):
+
+		window = analytical.MonthWindow('2026-12-31')
+
+		self.assertEqual((len(window), window[0], window[-1]), (12, '202601', '202612'))
+
+
+if __name__ == '__main__':
+	unittest.main()